@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -11,6 +12,18 @@ engine = create_engine(
     pool_recycle=1800   # 30분마다 연결 재활용
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 커뮤니티 라우터용 비동기 엔진 (asyncpg, DB 를 기다리는 동안 이벤트 루프를 막지 않음)
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
+# 커밋 후에도 응답을 만들 때 다시 조회하지 않도록 expire_on_commit=False
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # DB 세션 의존성 함수
@@ -20,3 +33,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# 비동기 DB 세션 의존성 함수
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,135 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+from app import models
+from app.database import SessionLocal
+from app.upload_storage import is_media_path
+
+# 업로드된 원본과 함께 만들어 두는 WebP 변환본 (긴 변 기준 최대 픽셀)
+IMAGE_VARIANTS = os.getenv("IMAGE_VARIANTS", "1") == "1"
+VARIANT_SIZES = {
+    "thumb": int(os.getenv("IMAGE_THUMB_EDGE", "320")),
+    "feed": int(os.getenv("IMAGE_FEED_EDGE", "1080")),
+}
+VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+
+# 응답에서 고를 수 있는 이미지 (변환본이 아직 없으면 원본)
+VARIANT_CHOICES = ("original",) + tuple(VARIANT_SIZES)
+
+# 종류별 (모델, 번호 컬럼, 썸네일 경로 컬럼, 피드 경로 컬럼)
+VARIANT_TARGETS = {
+    "community": (models.CommunityImage, "image_no", "image_thumb_path", "image_feed_path"),
+    "coment": (models.CommunityComentImage, "coment_image_no", "coment_image_thumb_path", "coment_image_feed_path"),
+}
+
+_pool = None
+
+
+def render_variants(image_path: str) -> dict:
+    """
+    원본 이미지로 변환본을 만들어 {변환본 이름: 경로} 반환 (작업 프로세스에서 실행)
+    디코딩 시 EXIF 방향을 적용하고 픽셀만 다시 인코딩하므로 EXIF(위치 정보 등)는 남지 않는다
+    """
+    import cv2
+    source = image_path.lstrip("/")
+    # 변환본 이름은 원본 파일 이름 전체 기준 ("{해시}.jpg.thumb.webp")
+    # 같은 내용이 확장자만 다르게 저장될 수 있으므로, 해시만으로 지으면 한쪽을 정리할 때 다른 쪽 변환본까지 지워짐
+    # 같은 내용이 이미 저장소에 있으면 변환본도 이미 있으므로 디코딩하지 않음
+    existing = {name: f"{source}.{name}.webp" for name in VARIANT_SIZES}
+    if all(os.path.exists(path) for path in existing.values()):
+        return {name: f"/{path}" for name, path in existing.items()}
+    img = cv2.imread(source, cv2.IMREAD_COLOR)
+    if img is None:
+        return {}
+    height, width = img.shape[:2]
+    paths = {}
+    for name, edge in VARIANT_SIZES.items():
+        scale = min(1.0, edge / max(height, width))
+        resized = img if scale >= 1.0 else cv2.resize(
+            img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+        )
+        ok, buf = cv2.imencode(".webp", resized, [cv2.IMWRITE_WEBP_QUALITY, VARIANT_QUALITY])
+        if not ok:
+            continue
+        path = f"{source}.{name}.webp"
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buf.tobytes())
+        os.replace(tmp_path, path)
+        paths[name] = f"/{path}"
+    return paths
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_variant_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _save_variant_paths(kind: str, rendered: list):
+    model, no_column, thumb_column, feed_column = VARIANT_TARGETS[kind]
+    orphans = []
+    db = SessionLocal()
+    try:
+        for image_no, paths in rendered:
+            updated = db.query(model).filter(getattr(model, no_column) == image_no).update(
+                {thumb_column: paths.get("thumb"), feed_column: paths.get("feed")},
+                synchronize_session=False
+            )
+            # 변환 중에 이미지가 삭제되었으면 만든 파일도 정리 (저장소 파일의 변환본은 공유되므로 저장소 정리 작업이 지움)
+            if not updated:
+                orphans.extend(path for path in paths.values() if not is_media_path(path))
+        db.commit()
+    finally:
+        db.close()
+    for path in orphans:
+        try:
+            os.remove(path.lstrip("/"))
+        except OSError:
+            pass
+
+
+async def generate_variants(kind: str, images: list):
+    """
+    BackgroundTasks 로 실행: [(이미지 번호, 원본 경로)] 의 변환본을 작업 프로세스 풀에서 만들고 경로를 기록
+    실패한 이미지는 원본만 제공된다
+    """
+    if not IMAGE_VARIANTS or not images:
+        return
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(pool, render_variants, path) for _, path in images),
+        return_exceptions=True
+    )
+    rendered = []
+    for (image_no, path), result in zip(images, results):
+        if isinstance(result, Exception):
+            print(f"Image variant failed for {path}: {result}")
+        elif result:
+            rendered.append((image_no, result))
+    if rendered:
+        await run_in_threadpool(_save_variant_paths, kind, rendered)
+
+
+def pick_variant(variant: str, original: str, thumb: str = None, feed: str = None) -> str:
+    """요청한 변환본 경로, 아직 만들어지지 않았으면 원본 경로"""
+    if variant == "thumb" and thumb:
+        return thumb
+    if variant == "feed" and feed:
+        return feed
+    return original
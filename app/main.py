@@ -3,15 +3,22 @@ from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine, async_engine, Base
+from app import readiness
+from app.pagination import NEXT_CURSOR_HEADER
+from app.image_variants import shutdown_variant_pool
+from app.upload_storage import run_media_gc
+from app.media_static import MediaStaticFiles
+from app.routers.health import router as health_router
 from app.routers.community.community_like import router as community_like_router  
+from app.routers.community.like_buffer import like_buffer
 from app.routers.community.community import router as community_router
 from app.routers.community.community_coment import router as community_coment_router
 from app.routers.schedule.schedule import router as schedule_router
 from app.routers.schedule.graph import router as graph_router
 from app.routers.users.users import router as users_router
 from app.routers.users.family import router as family_router
-from app.routers.measure.act_measure import router as act_measure_router
+from app.routers.measure.act_measure import router as act_measure_router, inference_engine
 from app.routers.measure.measure import router as measure_router
 from app.routers.measure.compare_avg import router as compare_avg_router
 import os
@@ -23,11 +30,30 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting application...")
+    # 무거운 서브시스템(검출 모델, 성장 기준표) 로딩 시점은 STARTUP_MODE 에 따름
+    warmup_task = None
+    if readiness.STARTUP_MODE == "eager":
+        await readiness.warm_up_all()
+    elif readiness.STARTUP_MODE == "warmup":
+        warmup_task = asyncio.create_task(readiness.warm_up_all())
+    if like_buffer:
+        like_buffer.start()
+    # 참조가 없어진 이미지 파일 정리
+    media_gc_task = asyncio.create_task(run_media_gc())
     try:
         yield
     except asyncio.CancelledError:
         print("Application shutdown interrupted.")
     finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        media_gc_task.cancel()
+        await inference_engine.close()
+        shutdown_variant_pool()
+        if like_buffer:
+            # 종료 전에 버퍼에 남은 좋아요 반영
+            await asyncio.get_running_loop().run_in_executor(None, like_buffer.stop)
+        await async_engine.dispose()
         print("Application shutdown complete.")
 
 app = FastAPI(title="GrowFarm Community API", lifespan=lifespan)
@@ -45,8 +71,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 # 라우터 추가
+app.include_router(health_router)
 app.include_router(act_measure_router)
 app.include_router(measure_router)
 app.include_router(compare_avg_router)
@@ -58,7 +86,8 @@ app.include_router(community_coment_router)
 app.include_router(users_router)
 app.include_router(family_router)
 
-# 정적 파일 제공 설정
+# 정적 파일 제공 설정 (내용 해시 저장소는 캐시 헤더가 붙는 전용 마운트를 먼저 등록)
+app.mount("/static/media", MediaStaticFiles(), name="media")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
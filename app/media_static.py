@@ -0,0 +1,50 @@
+import os
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from app.upload_storage import MEDIA_DIR
+
+# 저장소 파일은 경로에 내용 해시가 들어 있어 바뀌지 않으므로 1년 동안 캐시
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 설정하면 파일 대신 X-Accel-Redirect 헤더만 보내고 앞단 프록시(nginx internal location)가 파일을 전송
+# 예) MEDIA_ACCEL_REDIRECT_PREFIX=/_media/ -> X-Accel-Redirect: /_media/ab/cd/{해시}.jpg
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    내용 해시 저장소(static/media) 전용 정적 파일 제공
+    파일 이름(해시)을 강한 ETag 로 쓰고 immutable 캐시 헤더를 붙이며, If-None-Match 가 맞으면 304
+    Range 요청과 전송은 Starlette FileResponse 가 처리한다
+    """
+
+    def __init__(self, directory: str = MEDIA_DIR, **kwargs):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory=directory, **kwargs)
+
+    async def get_response(self, path: str, scope):
+        # 업로드 중인 임시 파일은 제공하지 않음
+        if path.replace("\\", "/").split("/", 1)[0] == "tmp":
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        headers = {
+            "etag": f'"{os.path.basename(full_path)}"',
+            "cache-control": MEDIA_CACHE_CONTROL,
+        }
+        if self.is_not_modified(Headers(headers), Headers(scope=scope)):
+            return NotModifiedResponse(Headers(headers))
+
+        if MEDIA_ACCEL_REDIRECT_PREFIX:
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            return Response(
+                status_code=status_code,
+                headers={**headers, "x-accel-redirect": MEDIA_ACCEL_REDIRECT_PREFIX + relative}
+            )
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers.update(headers)
+        return response
@@ -1,10 +1,13 @@
-from sqlalchemy import TIMESTAMP,TIME, Column, ForeignKey, Integer, String, DateTime, Text, UniqueConstraint
+from sqlalchemy import TIMESTAMP,TIME, Column, ForeignKey, Integer, String, DateTime, Text, UniqueConstraint, Index, Computed, DDL, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# 검색용 trigram 인덱스(gin_trgm_ops)에 필요한 확장 (이 메타데이터로 새 DB 를 만들 때만 실행, 기존 DB 는 migrations/002_community_search_trgm.sql)
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class User(Base):
     __tablename__ = "tb_users"
     user_no = Column(Integer, primary_key=True, index=True)
@@ -19,6 +22,16 @@ class User(Base):
 
     communities = relationship("Community", back_populates="owner")
 
+    # 닉네임 검색용 trigram 인덱스 (공백 제거 식 기준)
+    __table_args__ = (
+        Index(
+            "ix_tb_users_nickname_trgm",
+            func.replace(user_nickname, " ", "").label("user_nickname_nospace"),
+            postgresql_using="gin",
+            postgresql_ops={"user_nickname_nospace": "gin_trgm_ops"},
+        ),
+    )
+
 class Community(Base):
     __tablename__ = "tb_community"
     community_no = Column(Integer, primary_key=True, index=True)
@@ -26,10 +39,33 @@ class Community(Base):
     community_content = Column(Text, nullable=False)
     user_no = Column(Integer, ForeignKey("tb_users.user_no"), nullable=False)
     like_count = Column(Integer, default=0)
+    # 댓글 수 (댓글 작성/삭제 트랜잭션에서 함께 갱신, 기존 DB 는 migrations/003_community_comment_count.sql)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
     community_regist_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 검색용 정규화 제목 (공백 제거, DB 가 생성 컬럼으로 유지)
+    community_search_title = Column(Text, Computed("replace(community_title, ' ', '')", persisted=True))
     owner = relationship("User", back_populates="communities")
     images = relationship("CommunityImage", back_populates="community", cascade="all, delete-orphan")
 
+    # 피드/인기글 키셋 페이지네이션용 복합 인덱스 (기존 DB 는 migrations/001_community_keyset_indexes.sql)
+    __table_args__ = (
+        Index("ix_tb_community_regist_at_no", community_regist_at.desc(), community_no.desc()),
+        Index("ix_tb_community_like_count_no", like_count.desc(), community_no.desc()),
+        # 제목/본문 검색용 trigram 인덱스
+        Index(
+            "ix_tb_community_search_title_trgm",
+            community_search_title,
+            postgresql_using="gin",
+            postgresql_ops={"community_search_title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_tb_community_content_trgm",
+            func.replace(community_content, " ", "").label("community_content_nospace"),
+            postgresql_using="gin",
+            postgresql_ops={"community_content_nospace": "gin_trgm_ops"},
+        ),
+    )
+
 class CommunityLike(Base):
     __tablename__ = "tb_communitylike"
     like_id = Column(Integer, primary_key=True, index=True)
@@ -37,6 +73,11 @@ class CommunityLike(Base):
     user_no = Column(Integer, ForeignKey("tb_users.user_no"))
     like_regist_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # 한 사용자는 글마다 좋아요 하나 (토글의 ON CONFLICT 대상, 기존 DB 는 migrations/004_community_like_unique.sql)
+    __table_args__ = (
+        UniqueConstraint("community_no", "user_no", name="uq_tb_communitylike_community_user"),
+    )
+
 class CommunityComent(Base):
     __tablename__ = "tb_community_coment"
 
@@ -51,6 +92,9 @@ class CommunityImage(Base):
 
     image_no = Column(Integer, primary_key=True, autoincrement=True)
     image_path = Column(Text, nullable=False)
+    # 백그라운드에서 만든 WebP 변환본 (만들기 전에는 NULL, 기존 DB 는 migrations/005_image_variant_paths.sql)
+    image_thumb_path = Column(Text, nullable=True)
+    image_feed_path = Column(Text, nullable=True)
     community_no = Column(Integer, ForeignKey("tb_community.community_no", ondelete="CASCADE"), nullable=False)
     image_regist_at = Column(DateTime, server_default=func.now(), nullable=False)
 
@@ -62,9 +106,25 @@ class CommunityComentImage(Base):
 
     coment_image_no = Column(Integer, primary_key=True, autoincrement=True)
     coment_image_path = Column(Text, nullable=False)
+    coment_image_thumb_path = Column(Text, nullable=True)
+    coment_image_feed_path = Column(Text, nullable=True)
     coment_no = Column(Integer, ForeignKey("tb_community_coment.coment_no", ondelete="CASCADE"), nullable=False)
     coment_image_regist_at = Column(DateTime, server_default=func.now(), nullable=False)
 
+class MediaBlob(Base):
+    """내용 해시로 저장한 이미지 파일과 참조 수 (글/댓글 이미지, 프로필 이미지가 공유, 기존 DB 는 migrations/006_media_blob.sql)"""
+    __tablename__ = "tb_media_blob"
+
+    blob_path = Column(Text, primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    blob_regist_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # 참조 수가 0 이 된 시각 (유예 시간이 지나면 백그라운드에서 파일 삭제)
+    blob_released_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_tb_media_blob_released_at", blob_released_at, postgresql_where=ref_count == 0),
+    )
+
 class Family(Base):
     __tablename__ = "tb_family"
 
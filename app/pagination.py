@@ -0,0 +1,30 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+
+# 다음 페이지 커서를 전달하는 응답 헤더 (마지막 페이지면 헤더 없음)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# 커서로 이어서 조회할 때의 최대 페이지 크기
+MAX_CURSOR_PAGE_SIZE = 100
+
+
+def encode_cursor(*values) -> str:
+    """정렬 키 값들을 불투명한 커서 문자열로 인코딩"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, *types) -> tuple:
+    """커서 문자열을 types 순서대로 복원 (datetime 은 ISO 형식), 형식이 틀리면 400"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor length mismatch")
+        return tuple(
+            datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value, value_type in zip(values, types)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from fastapi import HTTPException
+
+# 시작 모드
+#   eager:  lifespan 에서 무거운 서브시스템(검출 모델, 성장 기준표)을 모두 로딩한 뒤 요청을 받음
+#   warmup: 서버는 바로 요청을 받고 lifespan 에서 백그라운드로 로딩 (필요한 요청은 준비될 때까지 대기)
+#   lazy:   해당 서브시스템이 필요한 첫 요청에서 로딩
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warmup")
+
+
+class Subsystem:
+    """필요할 때 한 번만 로딩되는 무거운 서브시스템 (loader 는 async 함수)"""
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.status = "pending"
+        self.error = None
+        self.load_seconds = None
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def _load(self):
+        self.status = "loading"
+        started = time.perf_counter()
+        try:
+            await self.loader()
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            raise
+        self.status = "ready"
+        self.error = None
+        self.load_seconds = round(time.perf_counter() - started, 2)
+
+    def mark_failed(self, error):
+        """준비된 뒤에 망가진 서브시스템을 실패로 표시 (다음 ensure_ready 에서 다시 로딩)"""
+        if self.ready:
+            self.status = "failed"
+            self.error = str(error)
+
+    async def ensure_ready(self):
+        if self.ready:
+            return
+        # 실패했던 로딩은 다음 요청에서 다시 시도
+        if self._task is None or (self._task.done() and self.status == "failed"):
+            self._task = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._task)
+
+    def report(self) -> dict:
+        return {"status": self.status, "load_seconds": self.load_seconds, "error": self.error}
+
+
+subsystems = {}
+
+
+def register(name: str, loader) -> Subsystem:
+    subsystems[name] = Subsystem(name, loader)
+    return subsystems[name]
+
+
+def require(name: str):
+    """라우트 의존성: 서브시스템이 준비될 때까지 대기, 로딩 실패 시 503"""
+    async def dependency():
+        try:
+            await subsystems[name].ensure_ready()
+        except Exception:
+            raise HTTPException(status_code=503, detail=f"{name} 준비 중 오류가 발생했습니다.")
+    return dependency
+
+
+async def warm_up_all():
+    results = await asyncio.gather(
+        *(subsystem.ensure_ready() for subsystem in subsystems.values()),
+        return_exceptions=True
+    )
+    for subsystem, result in zip(subsystems.values(), results):
+        if isinstance(result, Exception):
+            print(f"{subsystem.name} warm-up failed: {result}")
+
+
+def report() -> dict:
+    return {name: subsystem.report() for name, subsystem in subsystems.items()}
+
+
+def all_ready() -> bool:
+    return all(subsystem.ready for subsystem in subsystems.values())
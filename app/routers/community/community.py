@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, UploadFile, File, Form, Response
+from sqlalchemy import delete, func, insert, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import schemas, models, database
-from typing import List
-from uuid import uuid4
-import json
-import os
+from app.upload_storage import save_uploads, acquire_media, release_media, discard_uploads, delete_files
+from app.image_variants import VARIANT_CHOICES, generate_variants, pick_variant
+from app.pagination import MAX_CURSOR_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from app.routers.community.popular_cache import popular_ranking, POPULAR_ORDERS
+from app.routers.community.community_coment import load_coments, parse_keep_ids
+from app.routers.community.community_like import liked_by_user, load_like_statuses
+from app.routers.community.like_buffer import like_buffer
+from datetime import datetime
+from typing import List, Optional
 
 
 router = APIRouter(
@@ -13,34 +18,52 @@ router = APIRouter(
     tags=["communities"]
 )
 
-UPLOAD_DIR = "static/community_images"
-
 @router.get("/", response_model=List[schemas.CommunityOut])
-def read_communities(
+async def read_communities(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(database.get_db)
+    cursor: Optional[str] = Query(None, description="이전 응답의 X-Next-Cursor 값"),
+    user_no: Optional[int] = Query(None, description="liked_by_me 를 채울 사용자"),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    posts = (
-        db.query(
-            models.Community.community_no,
-            models.Community.community_title,
-            models.Community.community_content,
-            models.Community.user_no,
-            models.Community.community_regist_at,
-            models.Community.like_count,
-            models.User.user_nickname.label("user_nickname") 
-        )
+    columns = [
+        models.Community.community_no,
+        models.Community.community_title,
+        models.Community.community_content,
+        models.Community.user_no,
+        models.Community.community_regist_at,
+        models.Community.like_count,
+        models.Community.comment_count,
+        models.User.user_nickname.label("user_nickname") 
+    ]
+    # 좋아요 여부도 같은 쿼리에서 조회 (글마다 /community-likes/status 를 부르지 않도록)
+    if user_no is not None:
+        columns.append(liked_by_user(user_no))
+    query = (
+        select(*columns)
         .join(models.User, models.Community.user_no == models.User.user_no)
-        .order_by(models.Community.community_regist_at.desc())  
-        .offset(skip)
-        .limit(limit)
-        .all()
+        .order_by(models.Community.community_regist_at.desc(), models.Community.community_no.desc())
     )
+    # 커서가 있으면 (작성일, 글 번호) 키셋으로 이어서 조회, 없으면 기존 offset 방식
+    # (기존 offset 호출의 limit 는 그대로 두고, 커서 조회에만 페이지 크기 상한 적용)
+    if cursor:
+        limit = min(limit, MAX_CURSOR_PAGE_SIZE)
+        regist_at, community_no = decode_cursor(cursor, datetime, int)
+        query = query.where(
+            tuple_(models.Community.community_regist_at, models.Community.community_no) < (regist_at, community_no)
+        )
+    else:
+        query = query.offset(skip)
+    posts = (await db.execute(query.limit(limit))).all()
+
+    if posts and len(posts) == limit:
+        last = posts[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.community_regist_at, last.community_no)
 
     #print("Fetched posts:", posts)  # 디버깅용 출력
 
-    return [
+    result = [
         {
             "community_no": post.community_no,
             "community_title": post.community_title,
@@ -49,114 +72,129 @@ def read_communities(
             "user_nickname": post.user_nickname,  # user_nickname 포함
             "community_regist_at": post.community_regist_at,
             "like_count": post.like_count,
+            "comment_count": post.comment_count,
+            "liked_by_me": post.liked if user_no is not None else None,
         }
         for post in posts
     ]
+    # write-behind 모드에서는 아직 반영 전인 좋아요를 덮어서 보여줌
+    if like_buffer:
+        deltas = like_buffer.pending_deltas()
+        for item in result:
+            item["like_count"] = max((item["like_count"] or 0) + deltas.get(item["community_no"], 0), 0)
+            if user_no is not None:
+                buffered = like_buffer.state(item["community_no"], user_no)
+                if buffered is not None:
+                    item["liked_by_me"] = buffered
+    return result
 @router.post("/write", response_model=schemas.CommunityOut, status_code=status.HTTP_201_CREATED)
 async def create_community_with_images(
+    background_tasks: BackgroundTasks,
     community_title: str = Form(...),
     community_content: str = Form(...),
     user_no: int = Form(...),
     files: List[UploadFile] = File(None),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    db_comm = models.Community(
-        community_title=community_title,
-        community_content=community_content,
-        user_no=user_no,
-    )
-    db.add(db_comm)
-    db.commit()
-    db.refresh(db_comm)
-
-    db_images = []
+    # 파일을 먼저 저장하고, 글과 이미지 행은 한 트랜잭션으로 기록
+    saved_paths = await save_uploads(files)
     try:
-        # 여러 장 이미지 저장
-        if files:
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
-            for file in files:
-                ext = os.path.splitext(file.filename)[1]
-                filename = f"{uuid4().hex}{ext}"
-                file_path = os.path.join(UPLOAD_DIR, filename)
-                with open(file_path, "wb") as f:
-                    content = await file.read()
-                    f.write(content)
-                image_path = f"/{UPLOAD_DIR}/{filename}"
-                db_image = models.CommunityImage(
-                    community_no=db_comm.community_no,
-                    image_path=image_path
-                )
-                db.add(db_image)
-                db.commit()
-                db.refresh(db_image)
-                db_images.append(db_image)
-
-        # User와 조인하여 user_nickname 포함해서 반환
-        result = (
-            db.query(
+        # 글 추가(RETURNING)를 CTE 로 감싸고 작성자와 조인해서, 응답에 필요한 값(닉네임 포함)을 한 번에 받음
+        new_post = (
+            insert(models.Community)
+            .values(community_title=community_title, community_content=community_content, user_no=user_no)
+            .returning(
                 models.Community.community_no,
                 models.Community.community_title,
                 models.Community.community_content,
                 models.Community.user_no,
                 models.Community.community_regist_at,
                 models.Community.like_count,
-                models.User.user_nickname.label("user_nickname")
+                models.Community.comment_count
             )
-            .join(models.User, models.Community.user_no == models.User.user_no)
-            .filter(models.Community.community_no == db_comm.community_no)
-            .first()
+            .cte("new_post")
         )
+        post = (await db.execute(
+            select(new_post, models.User.user_nickname.label("user_nickname"))
+            .join(models.User, models.User.user_no == new_post.c.user_no)
+        )).first()
 
-        response = {
-            "community_no": result.community_no,
-            "community_title": result.community_title,
-            "community_content": result.community_content,
-            "user_no": result.user_no,
-            "user_nickname": result.user_nickname,
-            "community_regist_at": result.community_regist_at,
-            "like_count": result.like_count,
-            "images": [
-                {"image_no": img.image_no, "image_path": img.image_path}
-                for img in db_images
-            ] if db_images else []
-        }
-        return response
+        images = []
+        if saved_paths:
+            images = (await db.execute(
+                insert(models.CommunityImage)
+                .values([{"community_no": post.community_no, "image_path": path} for path in saved_paths])
+                .returning(models.CommunityImage.image_no, models.CommunityImage.image_path)
+            )).all()
+        await db.run_sync(acquire_media, saved_paths)
+        await db.commit()
 
     except Exception as e:
-        db.rollback()
-        # 파일 삭제
-        for img in db_images:
-            if img.image_path and os.path.exists(img.image_path[1:]):
-                os.remove(img.image_path[1:])
-        db.delete(db_comm)
-        db.commit()
+        await db.rollback()
+        # 저장한 파일은 정리 대상으로
+        await discard_uploads(saved_paths)
         raise HTTPException(status_code=500, detail=f"글/이미지 저장 중 오류: {str(e)}")
 
+    popular_ranking.notify_created()
+    # 썸네일/피드용 변환본은 응답 후 작업 프로세스에서 생성
+    background_tasks.add_task(generate_variants, "community", [(img.image_no, img.image_path) for img in images])
+    return {
+        "community_no": post.community_no,
+        "community_title": post.community_title,
+        "community_content": post.community_content,
+        "user_no": post.user_no,
+        "user_nickname": post.user_nickname,
+        "community_regist_at": post.community_regist_at,
+        "like_count": post.like_count,
+        "comment_count": post.comment_count,
+        "images": [
+            {"image_no": img.image_no, "image_path": img.image_path}
+            for img in images
+        ]
+    }
+
+# 검색 대상별 (공백 제거 정규화 식, 랭킹 가중치)
+# 식은 models 의 pg_trgm GIN 인덱스와 동일해야 인덱스를 탄다
+SEARCH_FIELDS = {
+    "title": (models.Community.community_search_title, 1.0),
+    "content": (func.replace(models.Community.community_content, " ", ""), 0.3),
+    "nickname": (func.replace(models.User.user_nickname, " ", ""), 0.5),
+}
+
 @router.get("/search", response_model=List[schemas.CommunityOut])
-def search_communities(
+async def search_communities(
     q: str = Query(..., min_length=1, description="검색어"),
-    db: Session = Depends(database.get_db)
+    fields: str = Query("title", description="검색 대상 (title, content, nickname 쉼표 구분)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     q_no_space = q.replace(" ", "")
-    posts = (
-        db.query(
+    targets = [SEARCH_FIELDS[f] for f in dict.fromkeys(fields.split(",")) if f in SEARCH_FIELDS]
+    if not targets or not q_no_space:
+        raise HTTPException(status_code=400, detail="검색어 또는 검색 대상이 올바르지 않습니다.")
+
+    # 포함 여부는 trigram 인덱스가 처리하는 ILIKE, 순위는 유사도 가중합
+    pattern = f"%{q_no_space}%"
+    condition = or_(*(expr.ilike(pattern) for expr, _ in targets))
+    rank = sum(func.similarity(expr, q_no_space) * weight for expr, weight in targets)
+    posts = (await db.execute(
+        select(
             models.Community.community_no,
             models.Community.community_title,
             models.Community.community_content,
             models.Community.user_no,
             models.Community.community_regist_at,
             models.Community.like_count,
+            models.Community.comment_count,
             models.User.user_nickname.label("user_nickname")
         )
         .join(models.User, models.Community.user_no == models.User.user_no)
-        .filter(
-            func.replace(models.Community.community_title, " ", "").ilike(f"%{q_no_space}%")
-            # func.replace(models.Community.community_content, " ", "").ilike(f"%{q_no_space}%") |
-            # func.replace(models.User.user_nickname, " ", "").ilike(f"%{q_no_space}%")
-        )
-        .order_by(models.Community.community_regist_at.desc())
-        .all()
-    )
+        .where(condition)
+        .order_by(rank.desc(), models.Community.community_regist_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )).all()
     return [
         {
             "community_no": post.community_no,
@@ -166,26 +204,57 @@ def search_communities(
             "user_nickname": post.user_nickname,
             "community_regist_at": post.community_regist_at,
             "like_count": post.like_count,
+            "comment_count": post.comment_count,
         }
         for post in posts
     ]
 
 @router.get("/popular", response_model=List[schemas.CommunityOut])
-def read_popular_communities(db: Session = Depends(database.get_db)):
-    posts = (
-        db.query(
+async def read_popular_communities(
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="이전 응답의 X-Next-Cursor 값"),
+    order: str = Query("likes", description="likes: 좋아요 순, hot: 시간 감쇠 점수 순"),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    if order not in POPULAR_ORDERS:
+        raise HTTPException(status_code=400, detail="지원하지 않는 정렬입니다.")
+
+    # 첫 페이지는 메모리의 인기글 순위에서 바로 응답
+    if not cursor and limit <= popular_ranking.size:
+        posts = await popular_ranking.top(db, limit, order)
+        if order == "likes" and len(posts) == limit:
+            last = posts[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["like_count"], last["community_no"])
+        return posts
+    if order == "hot":
+        raise HTTPException(status_code=400, detail="hot 정렬은 첫 페이지만 지원합니다.")
+
+    query = (
+        select(
             models.Community.community_no,
             models.Community.community_title,
             models.Community.community_content,
             models.Community.user_no,
             models.Community.community_regist_at,
             models.Community.like_count,
+            models.Community.comment_count,
             models.User.user_nickname.label("user_nickname")
         )
         .join(models.User, models.Community.user_no == models.User.user_no)
-        .order_by(models.Community.like_count.desc())
-        .all()
+        .order_by(models.Community.like_count.desc(), models.Community.community_no.desc())
     )
+    # (좋아요 수, 글 번호) 키셋 페이지네이션
+    if cursor:
+        like_count, community_no = decode_cursor(cursor, int, int)
+        query = query.where(
+            tuple_(models.Community.like_count, models.Community.community_no) < (like_count, community_no)
+        )
+    posts = (await db.execute(query.limit(limit))).all()
+
+    if len(posts) == limit:
+        last = posts[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.like_count, last.community_no)
     return [
         {
             "community_no": post.community_no,
@@ -195,39 +264,38 @@ def read_popular_communities(db: Session = Depends(database.get_db)):
             "user_nickname": post.user_nickname,
             "community_regist_at": post.community_regist_at,
             "like_count": post.like_count,
+            "comment_count": post.comment_count,
         }
         for post in posts
     ]
 
-@router.get("/{community_no}", response_model=schemas.CommunityOut)
-def read_community(
-    community_no: int,
-    db: Session = Depends(database.get_db)
-):
-    comm = (
-        db.query(
+# 글 + 작성자 닉네임 + 이미지를 한 번의 쿼리로 조회 (이미지는 LEFT JOIN 후 메모리에서 묶음)
+async def load_community_detail(db: AsyncSession, community_no: int, variant: str = "original"):
+    rows = (await db.execute(
+        select(
             models.Community.community_no,
             models.Community.community_title,
             models.Community.community_content,
             models.Community.user_no,
             models.Community.community_regist_at,
             models.Community.like_count,
-            models.User.user_nickname.label("user_nickname")
+            models.Community.comment_count,
+            models.User.user_nickname.label("user_nickname"),
+            models.CommunityImage.image_no,
+            models.CommunityImage.image_path,
+            models.CommunityImage.image_thumb_path,
+            models.CommunityImage.image_feed_path
         )
         .join(models.User, models.Community.user_no == models.User.user_no)
-        .filter(models.Community.community_no == community_no)
-        .first()
-    )
-
-    if not comm:
-        raise HTTPException(status_code=404, detail="Community not found")
-
-    images = db.query(
-        models.CommunityImage.image_no,
-        models.CommunityImage.image_path
-    ).filter(models.CommunityImage.community_no == community_no).all()
+        .outerjoin(models.CommunityImage, models.CommunityImage.community_no == models.Community.community_no)
+        .where(models.Community.community_no == community_no)
+        .order_by(models.CommunityImage.image_no)
+    )).all()
+    if not rows:
+        return None
 
-    response = {
+    comm = rows[0]
+    return {
         "community_no": comm.community_no,
         "community_title": comm.community_title,
         "community_content": comm.community_content,
@@ -235,96 +303,168 @@ def read_community(
         "user_nickname": comm.user_nickname,
         "community_regist_at": comm.community_regist_at,
         "like_count": comm.like_count,
+        "comment_count": comm.comment_count,
         "images": [
-            {"image_no": img.image_no, "image_path": img.image_path}
-            for img in images
+            {
+                "image_no": row.image_no,
+                "image_path": pick_variant(variant, row.image_path, row.image_thumb_path, row.image_feed_path)
+            }
+            for row in rows if row.image_no is not None
         ]
     }
+
+@router.get("/{community_no}", response_model=schemas.CommunityOut)
+async def read_community(
+    community_no: int,
+    variant: str = Query("original", description="이미지 크기: original, feed, thumb"),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    if variant not in VARIANT_CHOICES:
+        raise HTTPException(status_code=400, detail="잘못된 이미지 크기입니다.")
+    response = await load_community_detail(db, community_no, variant)
+    if not response:
+        raise HTTPException(status_code=404, detail="Community not found")
     return response
 
+# 글 상세 화면에 필요한 섹션
+DETAIL_FIELDS = ("post", "comments", "like", "counts")
+
+@router.get("/{community_no}/detail")
+async def read_community_detail(
+    community_no: int,
+    user_no: Optional[int] = Query(None, description="좋아요 여부를 확인할 사용자"),
+    fields: str = Query(",".join(DETAIL_FIELDS), description="post, comments, like, counts 쉼표 구분"),
+    coment_limit: Optional[int] = Query(None, ge=1, le=200),
+    coment_cursor: Optional[str] = Query(None),
+    variant: str = Query("original", description="이미지 크기: original, feed, thumb"),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """글, 이미지, 댓글, 좋아요 여부, 댓글/좋아요 수를 한 번에 조회 (최대 쿼리 4개)"""
+    selected = {f for f in fields.split(",") if f in DETAIL_FIELDS}
+    if not selected:
+        raise HTTPException(status_code=400, detail="조회할 항목이 올바르지 않습니다.")
+    if variant not in VARIANT_CHOICES:
+        raise HTTPException(status_code=400, detail="잘못된 이미지 크기입니다.")
+
+    # 1) 글 + 닉네임 + 이미지
+    post = await load_community_detail(db, community_no, variant)
+    if not post:
+        raise HTTPException(status_code=404, detail="Community not found")
+    result = {}
+    if "post" in selected:
+        result["post"] = post
+
+    # 2) 좋아요 여부 (댓글/좋아요 수는 글에 저장된 카운터 사용)
+    #    /community-likes/status 와 같은 함수로 읽어서 write-behind 버퍼의 반영 전 좋아요도 보이게 함
+    if selected & {"like", "counts"}:
+        like = None
+        if user_no is not None:
+            like = (await load_like_statuses(db, [community_no], user_no)).get(community_no)
+        if like is None:
+            count = post["like_count"] or 0
+            if like_buffer:
+                count = max(count + like_buffer.pending_delta(community_no), 0)
+            # 사용자를 모르면 좋아요 여부도 알 수 없으므로 목록의 liked_by_me 와 같이 None
+            like = {"liked": None if user_no is None else False, "count": count}
+        if "like" in selected:
+            result["like"] = like
+        if "counts" in selected:
+            result["counts"] = {"coments": post["comment_count"], "likes": like["count"]}
+
+    # 3) 댓글 + 4) 댓글 이미지
+    if "comments" in selected:
+        coments, next_cursor = await load_coments(db, community_no, coment_limit, coment_cursor, variant)
+        result["comments"] = coments
+        result["comments_next_cursor"] = next_cursor
+
+    return result
+
 @router.put("/{community_no}", response_model=schemas.CommunityOut)
 async def update_community(
     community_no: int,
+    background_tasks: BackgroundTasks,
     community_title: str = Form(...),
     community_content: str = Form(...),
     keep_origin_images: str = Form(...), 
     files: List[UploadFile] = File(None),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    comm = db.query(models.Community).get(community_no)
+    # 파일을 저장하기 전에 검증 (저장 후 실패하면 참조도 정리 표시도 없는 파일이 남음)
+    keep_ids = parse_keep_ids(keep_origin_images)
+    comm = await db.get(models.Community, community_no)
     if not comm:
         raise HTTPException(status_code=404, detail="Community not found")
     comm.community_title = community_title
     comm.community_content = community_content
     comm.community_regist_at = func.now()
 
-    # 기존 이미지 중 남길 것만 남기고 삭제
-    keep_ids = json.loads(keep_origin_images)
-    all_images = db.query(models.CommunityImage).filter(models.CommunityImage.community_no == community_no).all()
+    # 기존 이미지 중 남길 것만 남기고 삭제, 새 이미지는 여러 장 추가 (다시 올린 같은 사진은 저장소 파일을 그대로 공유)
+    all_images = (await db.execute(
+        select(models.CommunityImage).where(models.CommunityImage.community_no == community_no)
+    )).scalars().all()
+    removed = []
     for img in all_images:
         if img.image_no not in keep_ids:
-            if img.image_path and os.path.exists(img.image_path[1:]):
-                os.remove(img.image_path[1:])
-            db.delete(img)
-    db.commit()
-
-    # 새 이미지가 있으면 여러 장 추가
-    if files:
-        for file in files:
-            ext = os.path.splitext(file.filename)[1]
-            filename = f"{uuid4().hex}{ext}"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            image_path = f"/{UPLOAD_DIR}/{filename}"
-            db_image = models.CommunityImage(
-                community_no=community_no,
-                image_path=image_path
-            )
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-
-    db.commit()
-    db.refresh(comm)
+            removed.append((img.image_path, img.image_thumb_path, img.image_feed_path))
+            await db.delete(img)
+    # 파일 저장 이후에는 실패 시 정리하는 try 블록까지 바로 이어지도록 함
+    saved_paths = await save_uploads(files)
+    new_images = [
+        models.CommunityImage(community_no=community_no, image_path=image_path)
+        for image_path in saved_paths
+    ]
+    db.add_all(new_images)
+    try:
+        legacy_paths = await db.run_sync(release_media, removed)
+        await db.run_sync(acquire_media, saved_paths)
+        await db.flush()
+        variant_jobs = [(img.image_no, img.image_path) for img in new_images]
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        await discard_uploads(saved_paths)
+        raise
+    # 예전 방식으로 저장된 파일은 응답 후 삭제
+    background_tasks.add_task(delete_files, legacy_paths)
+    popular_ranking.invalidate_post(community_no)
+    background_tasks.add_task(generate_variants, "community", variant_jobs)
 
     # 결과 반환 (상세조회와 동일하게)
-    images = db.query(
-        models.CommunityImage.image_no,
-        models.CommunityImage.image_path
-    ).filter(models.CommunityImage.community_no == community_no).all()
-
-    response = {
-        "community_no": comm.community_no,
-        "community_title": comm.community_title,
-        "community_content": comm.community_content,
-        "user_no": comm.user_no,
-        "user_nickname": db.query(models.User.user_nickname).filter(models.User.user_no == comm.user_no).scalar(),
-        "community_regist_at": comm.community_regist_at,
-        "like_count": comm.like_count,
-        "images": [
-            {"image_no": img.image_no, "image_path": img.image_path}
-            for img in images
-        ]
-    }
-    return response
+    return await load_community_detail(db, community_no)
 
 @router.delete("/{community_no}", status_code=204)
 async def delete_community(
     community_no: int,
-    db: Session = Depends(database.get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    comm = db.query(models.Community).get(community_no)
-    if not comm:
+    # 글/댓글 이미지 행을 지우면서 경로를 받아 참조 수만 줄임 (파일은 백그라운드 정리 작업이 삭제)
+    images = (await db.execute(
+        delete(models.CommunityImage)
+        .where(models.CommunityImage.community_no == community_no)
+        .returning(
+            models.CommunityImage.image_path,
+            models.CommunityImage.image_thumb_path,
+            models.CommunityImage.image_feed_path
+        )
+    )).all()
+    coment_images = (await db.execute(
+        delete(models.CommunityComentImage)
+        .where(models.CommunityComentImage.coment_no.in_(
+            select(models.CommunityComent.coment_no).where(models.CommunityComent.community_no == community_no)
+        ))
+        .returning(
+            models.CommunityComentImage.coment_image_path,
+            models.CommunityComentImage.coment_image_thumb_path,
+            models.CommunityComentImage.coment_image_feed_path
+        )
+    )).all()
+    deleted = await db.execute(delete(models.Community).where(models.Community.community_no == community_no))
+    if not deleted.rowcount:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Community not found")
-
-    # 이미지 파일 및 DB 삭제
-    images = db.query(models.CommunityImage).filter(models.CommunityImage.community_no == community_no).all()
-    for img in images:
-        if img.image_path and os.path.exists(img.image_path[1:]):
-            os.remove(img.image_path[1:])
-        db.delete(img)
-    db.delete(comm)
-    db.commit()
+    legacy_paths = await db.run_sync(release_media, images + coment_images)
+    await db.commit()
+    background_tasks.add_task(delete_files, legacy_paths)
+    popular_ranking.invalidate_post(community_no)
     return
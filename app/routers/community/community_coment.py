@@ -1,89 +1,171 @@
-import datetime
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from collections import defaultdict
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, UploadFile, File, Form, Query, Response
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models, schemas
-from app.database import get_db
-from typing import List
-from uuid import uuid4
-import os
+from app.database import get_async_db
+from app.upload_storage import save_uploads, acquire_media, release_media, discard_uploads, delete_files
+from app.image_variants import VARIANT_CHOICES, generate_variants, pick_variant
+from app.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from app.routers.community.popular_cache import popular_ranking
+from typing import List, Optional
+import json
 import shutil
 
 router = APIRouter(
     prefix="/coments",
     tags=["coments"]
 )
-UPLOAD_DIR = "static/coment_images"
+
+def parse_keep_ids(keep_origin_images: str) -> set:
+    """수정 폼의 keep_origin_images(남길 이미지 번호 JSON 배열) 파싱, 형식이 틀리면 400"""
+    try:
+        keep_ids = json.loads(keep_origin_images)
+    except ValueError:
+        keep_ids = None
+    if not isinstance(keep_ids, list) or not all(isinstance(no, int) for no in keep_ids):
+        raise HTTPException(status_code=400, detail="keep_origin_images 형식이 올바르지 않습니다.")
+    return set(keep_ids)
 
 @router.post("/add", response_model=schemas.CommunityComentOut)
 async def create_coment_with_images(
+    background_tasks: BackgroundTasks,
     coment_content: str = Form(...),
     community_no: int = Form(...),
     user_no: int = Form(...),
     files: list[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_coment = models.CommunityComent(
-        coment_content=coment_content,
-        community_no=community_no,
-        user_no=user_no,
-    )
-    db.add(db_coment)
-    db.commit()
-    db.refresh(db_coment)
-
-    db_images = []
-    if files:
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        for file in files:
-            ext = os.path.splitext(file.filename)[1]
-            filename = f"{uuid4().hex}{ext}"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            image_path = f"/{UPLOAD_DIR}/{filename}"
-            db_image = models.CommunityComentImage(
-                coment_no=db_coment.coment_no,
-                coment_image_path=image_path
+    # 파일을 먼저 저장해서, 글 행 잠금(댓글 수 갱신)은 DB 작업 동안만 잡히도록 함
+    saved_paths = await save_uploads(files)
+    try:
+        # 댓글 추가, 글의 댓글 수 증가, 이미지 추가를 한 트랜잭션으로 처리
+        comment_count = (await db.execute(
+            update(models.Community)
+            .where(models.Community.community_no == community_no)
+            .values(comment_count=models.Community.comment_count + 1)
+            .returning(models.Community.comment_count)
+        )).scalar()
+        if comment_count is None:
+            raise LookupError("Community not found")
+
+        # 댓글 추가(RETURNING)를 CTE 로 감싸고 작성자와 조인해서 닉네임까지 한 번에 받음
+        new_coment = (
+            insert(models.CommunityComent)
+            .values(coment_content=coment_content, community_no=community_no, user_no=user_no)
+            .returning(
+                models.CommunityComent.coment_no,
+                models.CommunityComent.coment_content,
+                models.CommunityComent.coment_regist_at,
+                models.CommunityComent.community_no,
+                models.CommunityComent.user_no
             )
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-            db_images.append(db_image)
-
-    user_nickname = (
-        db.query(models.User.user_nickname)
-        .filter(models.User.user_no == db_coment.user_no)
-        .scalar()
-    )
+            .cte("new_coment")
+        )
+        db_coment = (await db.execute(
+            select(new_coment, models.User.user_nickname.label("user_nickname"))
+            .join(models.User, models.User.user_no == new_coment.c.user_no)
+        )).first()
+
+        images = []
+        if saved_paths:
+            images = (await db.execute(
+                insert(models.CommunityComentImage)
+                .values([{"coment_no": db_coment.coment_no, "coment_image_path": path} for path in saved_paths])
+                .returning(models.CommunityComentImage.coment_image_no, models.CommunityComentImage.coment_image_path)
+            )).all()
+        await db.run_sync(acquire_media, saved_paths)
+        await db.commit()
 
+    except Exception as e:
+        await db.rollback()
+        await discard_uploads(saved_paths)
+        if isinstance(e, LookupError):
+            raise HTTPException(status_code=404, detail="Community not found")
+        raise HTTPException(status_code=500, detail=f"댓글/이미지 저장 중 오류: {str(e)}")
+
+    popular_ranking.apply_comment_count(community_no, comment_count)
+    background_tasks.add_task(
+        generate_variants, "coment", [(img.coment_image_no, img.coment_image_path) for img in images]
+    )
     return {
         "coment_no": db_coment.coment_no,
         "coment_content": db_coment.coment_content,
         "coment_regist_at": db_coment.coment_regist_at,
         "community_no": db_coment.community_no,
         "user_no": db_coment.user_no,
-        "user_nickname": user_nickname,
+        "user_nickname": db_coment.user_nickname,
         "images": [
             {"coment_image_no": img.coment_image_no, "coment_image_path": img.coment_image_path}
-            for img in db_images
-        ] if db_images else []
+            for img in images
+        ]
     }
 
 @router.delete("/{coment_no}")
-def delete_coment(coment_no: int, db: Session = Depends(get_db)):
-    db_coment = db.query(models.CommunityComent).filter(models.CommunityComent.coment_no == coment_no).first()
-    if not db_coment:
+async def delete_coment(coment_no: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    # 이미지 행을 지우면서 경로를 받아 참조 수만 줄임 (파일은 백그라운드 정리 작업이 삭제)
+    images = (await db.execute(
+        delete(models.CommunityComentImage)
+        .where(models.CommunityComentImage.coment_no == coment_no)
+        .returning(
+            models.CommunityComentImage.coment_image_path,
+            models.CommunityComentImage.coment_image_thumb_path,
+            models.CommunityComentImage.coment_image_feed_path
+        )
+    )).all()
+    community_no = (await db.execute(
+        delete(models.CommunityComent)
+        .where(models.CommunityComent.coment_no == coment_no)
+        .returning(models.CommunityComent.community_no)
+    )).scalar()
+    if community_no is None:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="댓글을 찾을 수 없음.")
-    db.delete(db_coment)
-    db.commit()
+    legacy_paths = await db.run_sync(release_media, images)
+    comment_count = (await db.execute(
+        update(models.Community)
+        .where(models.Community.community_no == community_no)
+        .values(comment_count=func.greatest(models.Community.comment_count - 1, 0))
+        .returning(models.Community.comment_count)
+    )).scalar()
+    await db.commit()
+    background_tasks.add_task(delete_files, legacy_paths)
+    if comment_count is not None:
+        popular_ranking.apply_comment_count(community_no, comment_count)
     return {"삭제 되었습니다."}
 
-@router.get("/list", response_model=List[schemas.CommunityComentOut])
-def get_coments(community_no: int, db: Session = Depends(get_db)):
-    coments = (
-        db.query(
+# 여러 댓글의 이미지를 IN 쿼리 한 번으로 조회해서 댓글 번호별로 묶음
+async def load_coment_images(db: AsyncSession, coment_nos, variant: str = "original"):
+    images_by_coment = defaultdict(list)
+    if not coment_nos:
+        return images_by_coment
+    images = (await db.execute(
+        select(
+            models.CommunityComentImage.coment_no,
+            models.CommunityComentImage.coment_image_no,
+            models.CommunityComentImage.coment_image_path,
+            models.CommunityComentImage.coment_image_thumb_path,
+            models.CommunityComentImage.coment_image_feed_path
+        )
+        .where(models.CommunityComentImage.coment_no.in_(coment_nos))
+        .order_by(models.CommunityComentImage.coment_image_no)
+    )).all()
+    for img in images:
+        images_by_coment[img.coment_no].append(
+            {
+                "coment_image_no": img.coment_image_no,
+                "coment_image_path": pick_variant(
+                    variant, img.coment_image_path, img.coment_image_thumb_path, img.coment_image_feed_path
+                )
+            }
+        )
+    return images_by_coment
+
+# 댓글 목록 조회 (작성 순, limit 을 주면 coment_no 키셋 페이지네이션) -> (댓글 목록, 다음 커서)
+async def load_coments(db: AsyncSession, community_no: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                       variant: str = "original"):
+    query = (
+        select(
             models.CommunityComent.coment_no,
             models.CommunityComent.coment_content,
             models.CommunityComent.coment_regist_at,
@@ -92,95 +174,113 @@ def get_coments(community_no: int, db: Session = Depends(get_db)):
             models.User.user_nickname
         )
         .join(models.User, models.CommunityComent.user_no == models.User.user_no)
-        .filter(models.CommunityComent.community_no == community_no)
-        .all()
+        .where(models.CommunityComent.community_no == community_no)
+        .order_by(models.CommunityComent.coment_no)
     )
+    if cursor:
+        (after_no,) = decode_cursor(cursor, int)
+        query = query.where(models.CommunityComent.coment_no > after_no)
+    if limit:
+        query = query.limit(limit)
+    coments = (await db.execute(query)).all()
 
-    result = []
-    for coment in coments:
-        images = db.query(models.CommunityComentImage).filter(
-            models.CommunityComentImage.coment_no == coment.coment_no
-        ).all()
-        result.append({
+    images_by_coment = await load_coment_images(db, [coment.coment_no for coment in coments], variant)
+    result = [
+        {
             "coment_no": coment.coment_no,
             "coment_content": coment.coment_content,
             "coment_regist_at": coment.coment_regist_at,
             "community_no": coment.community_no,
             "user_no": coment.user_no,
             "user_nickname": coment.user_nickname,
-            "images": [
-                {"coment_image_no": img.coment_image_no, "coment_image_path": img.coment_image_path}
-                for img in images
-            ]
-        })
+            "images": images_by_coment.get(coment.coment_no, [])
+        }
+        for coment in coments
+    ]
+    next_cursor = encode_cursor(coments[-1].coment_no) if limit and len(coments) == limit else None
+    return result, next_cursor
+
+@router.get("/list", response_model=List[schemas.CommunityComentOut])
+async def get_coments(
+    community_no: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="이전 응답의 X-Next-Cursor 값"),
+    variant: str = Query("original", description="이미지 크기: original, feed, thumb"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if variant not in VARIANT_CHOICES:
+        raise HTTPException(status_code=400, detail="잘못된 이미지 크기입니다.")
+    result, next_cursor = await load_coments(db, community_no, limit, cursor, variant)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return result
 
 @router.get("/", response_model=List[schemas.CommunityComentOut])
-def get_coments_root(community_no: int, db: Session = Depends(get_db)):
-    return get_coments(community_no, db)
+async def get_coments_root(
+    community_no: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="이전 응답의 X-Next-Cursor 값"),
+    variant: str = Query("original", description="이미지 크기: original, feed, thumb"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await get_coments(community_no, response, limit, cursor, variant, db)
 
 @router.put("/{coment_no}", response_model=schemas.ComentResponse)
 async def update_coment(
     coment_no: int,
+    background_tasks: BackgroundTasks,
     coment_content: str = Form(...),
     keep_origin_images: str = Form(...),
     files: list[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    import json
-
-    coment = db.query(models.CommunityComent).filter(models.CommunityComent.coment_no == coment_no).first()
+    # 파일을 저장하기 전에 검증 (저장 후 실패하면 참조도 정리 표시도 없는 파일이 남음)
+    keep_ids = parse_keep_ids(keep_origin_images)
+    coment = await db.get(models.CommunityComent, coment_no)
     if not coment:
         raise HTTPException(status_code=404, detail="댓글을 찾을 수 없습니다.")
 
     # 댓글 내용 수정
     coment.coment_content = coment_content
-    coment.coment_regist_at = datetime.datetime.now(datetime.timezone.utc)
-    db.commit()
-    db.refresh(coment)
-
-    # 기존 이미지 유지/삭제 처리
-    keep_ids = set(json.loads(keep_origin_images))
-    all_images = db.query(models.CommunityComentImage).filter(
-        models.CommunityComentImage.coment_no == coment_no
-    ).all()
+    # 컬럼이 timezone 없는 timestamp 이므로 DB 시각으로 기록 (asyncpg 는 timezone 있는 datetime 을 거부, update_community 와 동일)
+    coment.coment_regist_at = func.now()
+
+    # 기존 이미지 유지/삭제 처리, 새 이미지 추가
+    all_images = (await db.execute(
+        select(models.CommunityComentImage).where(models.CommunityComentImage.coment_no == coment_no)
+    )).scalars().all()
+    removed = []
     for img in all_images:
         if img.coment_image_no not in keep_ids:
-            # 파일도 삭제
-            try:
-                file_path = img.coment_image_path.lstrip("/")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception:
-                pass
-            db.delete(img)
-    db.commit()
-
-    # 새 이미지 추가
-    db_images = []
-    if files:
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        for file in files:
-            ext = os.path.splitext(file.filename)[1]
-            filename = f"{uuid4().hex}{ext}"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            image_path = f"/{UPLOAD_DIR}/{filename}"
-            db_image = models.CommunityComentImage(
-                coment_no=coment.coment_no,
-                coment_image_path=image_path
-            )
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-            db_images.append(db_image)
+            removed.append((img.coment_image_path, img.coment_image_thumb_path, img.coment_image_feed_path))
+            await db.delete(img)
+    # 파일 저장 이후에는 실패 시 정리하는 try 블록까지 바로 이어지도록 함
+    saved_paths = await save_uploads(files)
+    new_images = [
+        models.CommunityComentImage(coment_no=coment.coment_no, coment_image_path=image_path)
+        for image_path in saved_paths
+    ]
+    db.add_all(new_images)
+    try:
+        legacy_paths = await db.run_sync(release_media, removed)
+        await db.run_sync(acquire_media, saved_paths)
+        await db.flush()
+        # 응답에 쓸 수정 시각을 같은 트랜잭션에서 읽어 둠 (SQL 식으로 넣은 값은 flush 후 만료됨)
+        await db.refresh(coment, ["coment_regist_at"])
+        variant_jobs = [(img.coment_image_no, img.coment_image_path) for img in new_images]
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        await discard_uploads(saved_paths)
+        raise
+    # 예전 방식으로 저장된 파일은 응답 후 삭제
+    background_tasks.add_task(delete_files, legacy_paths)
+    background_tasks.add_task(generate_variants, "coment", variant_jobs)
 
-    # 남은 이미지 목록
-    remain_images = db.query(models.CommunityComentImage).filter(
-        models.CommunityComentImage.coment_no == coment_no
-    ).all()
+    # 남은 이미지 목록 (남긴 기존 이미지 + 새 이미지, 다시 조회하지 않음)
+    remain_images = [img for img in all_images if img.coment_image_no in keep_ids] + new_images
 
     return {
         "coment_no": coment.coment_no,
@@ -195,10 +295,15 @@ async def update_coment(
     }
 
 @router.get("/counts", response_model=dict)
-def get_all_coment_counts(db: Session = Depends(get_db)):
-    counts = (
-        db.query(models.CommunityComent.community_no, func.count(models.CommunityComent.coment_no).label("count"))
-        .group_by(models.CommunityComent.community_no)
-        .all()
-    )
-    return {"counts": {row.community_no: row.count for row in counts}}
\ No newline at end of file
+async def get_all_coment_counts(
+    community_nos: Optional[List[int]] = Query(None, description="조회할 글 번호 (없으면 댓글이 있는 모든 글)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # 글에 저장된 댓글 수를 그대로 사용 (댓글 테이블 전체 집계 없음)
+    query = select(models.Community.community_no, models.Community.comment_count)
+    if community_nos:
+        query = query.where(models.Community.community_no.in_(community_nos))
+    else:
+        query = query.where(models.Community.comment_count > 0)
+    rows = (await db.execute(query)).all()
+    return {"counts": {row.community_no: row.comment_count for row in rows}}
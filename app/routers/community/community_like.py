@@ -1,61 +1,127 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
 from app import models
-from app.database import get_db
+from app.database import get_async_db
+from app.routers.community.popular_cache import popular_ranking
+from app.routers.community.like_buffer import like_buffer
 
 router = APIRouter(
     prefix="/community-likes",  # 전체 경로의 접두사를 통일
     tags=["community-like"]
 )
 
+# 좋아요 토글을 한 번의 왕복으로 처리
+#   removed:  이미 좋아요가 있으면 삭제
+#   inserted: 삭제된 게 없으면 추가 (동시 요청으로 이미 들어갔으면 ON CONFLICT 로 무시)
+#   UPDATE:   글의 좋아요 수를 DB 에서 증감 (행 잠금은 이 문장 안에서만 유지)
+TOGGLE_LIKE_SQL = text("""
+    WITH removed AS (
+        DELETE FROM tb_communitylike
+        WHERE community_no = :community_no AND user_no = :user_no
+        RETURNING like_id
+    ), inserted AS (
+        INSERT INTO tb_communitylike (community_no, user_no)
+        SELECT :community_no, :user_no
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (community_no, user_no) DO NOTHING
+        RETURNING like_id
+    )
+    UPDATE tb_community
+    SET like_count = GREATEST(
+        COALESCE(like_count, 0) + (SELECT count(*) FROM inserted) - (SELECT count(*) FROM removed), 0
+    )
+    WHERE community_no = :community_no
+    RETURNING like_count,
+        (SELECT count(*) FROM inserted) AS inserted,
+        (SELECT count(*) FROM removed) AS removed
+""")
+
+def liked_by_user(user_no: int):
+    """글 조회 쿼리에 붙이는 좋아요 여부 컬럼 (uq_tb_communitylike_community_user 인덱스 사용)"""
+    return exists().where(
+        models.CommunityLike.community_no == models.Community.community_no,
+        models.CommunityLike.user_no == user_no
+    ).label("liked")
+
+
+async def load_like_statuses(db: AsyncSession, community_nos: List[int], user_no: int) -> dict:
+    """여러 글의 좋아요 여부와 좋아요 수를 쿼리 한 번으로 조회 -> {글 번호: {"liked", "count"}}"""
+    rows = (await db.execute(
+        select(models.Community.community_no, models.Community.like_count, liked_by_user(user_no))
+        .where(models.Community.community_no.in_(community_nos))
+    )).all()
+    deltas = like_buffer.pending_deltas() if like_buffer else {}
+    statuses = {}
+    for row in rows:
+        liked, count = row.liked, row.like_count or 0
+        # write-behind 모드에서는 아직 반영 전인 좋아요를 덮어서 보여줌
+        if like_buffer:
+            buffered = like_buffer.state(row.community_no, user_no)
+            liked = buffered if buffered is not None else liked
+            count = max(count + deltas.get(row.community_no, 0), 0)
+        statuses[row.community_no] = {"liked": bool(liked), "count": count}
+    return statuses
+
+
 @router.get("/status")
-def get_like_status(
+async def get_like_status(
     community_no: int = Query(...),
     user_no: int = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    community = db.query(models.Community).filter_by(community_no=community_no).first()
-    if not community:
+    statuses = await load_like_statuses(db, [community_no], user_no)
+    if community_no not in statuses:
         raise HTTPException(status_code=404, detail="Community not found")
-    
-    existing_like = db.query(models.CommunityLike).filter_by(
-        community_no=community_no,
-        user_no=user_no
-    ).first()
+    return statuses[community_no]
 
-    return {
-        "liked": existing_like is not None,
-        "count": community.like_count
-    }
+# 피드 한 페이지의 좋아요 상태를 한 번에 조회 (없는 글은 결과에서 빠짐)
+@router.get("/status/batch")
+async def get_like_statuses(
+    community_nos: List[int] = Query(..., description="조회할 글 번호 (최대 100개)"),
+    user_no: int = Query(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if len(community_nos) > 100:
+        raise HTTPException(status_code=400, detail="한 번에 최대 100개까지 조회할 수 있습니다.")
+    return {"statuses": await load_like_statuses(db, community_nos, user_no)}
 
 @router.post("/toggle/{community_no}/like")
-def toggle_like(
+async def toggle_like(
     community_no: int,
     user_no: int = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    community = db.query(models.Community).filter_by(community_no=community_no).first()
-    if not community:
-        raise HTTPException(status_code=404, detail="Community post not found")
+    if like_buffer:
+        # 버퍼에 기록하고 바로 응답 (DB 반영은 flush 스레드가 모아서 처리)
+        toggled = await db.run_sync(like_buffer.toggle, community_no, user_no)
+        if toggled is None:
+            raise HTTPException(status_code=404, detail="Community post not found")
+        liked, like_count = toggled
+        return {
+            "message": f"Post successfully {'liked' if liked else 'unliked'}",
+            "like_count": like_count
+        }
 
-    existing_like = db.query(models.CommunityLike).filter_by(
-        community_no=community_no,
-        user_no=user_no
-    ).first()
-
-    if existing_like:
-        db.delete(existing_like)
-        community.like_count = max(community.like_count - 1, 0)
-        action = "unliked"
-    else:
-        new_like = models.CommunityLike(community_no=community_no, user_no=user_no)
-        db.add(new_like)
-        community.like_count += 1
-        action = "liked"
+    try:
+        row = (await db.execute(TOGGLE_LIKE_SQL, {"community_no": community_no, "user_no": user_no})).first()
+    except IntegrityError:
+        # 글 또는 사용자가 없어서 외래 키 위반
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Community post not found")
+    if row is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Community post not found")
+    await db.commit()
 
-    db.commit()
+    # 삭제된 게 없으면 좋아요 상태 (동시 요청이 먼저 추가한 경우 포함)
+    action = "unliked" if row.removed else "liked"
+    # 인기글 순위 캐시를 재계산 없이 갱신
+    popular_ranking.apply_like(community_no, row.like_count)
 
     return {
         "message": f"Post successfully {action}",
-        "like_count": community.like_count
+        "like_count": row.like_count
     }
@@ -0,0 +1,191 @@
+import os
+import threading
+from collections import Counter
+from sqlalchemy import Integer, column, delete, exists, select, text, tuple_, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app import models
+from app.database import SessionLocal
+from app.routers.community.popular_cache import popular_ranking
+
+# 좋아요를 메모리에 모아 두었다가 주기적으로 한 번에 반영 (인기글에 몰리는 tb_community 행 잠금 경합 제거)
+LIKE_WRITE_BEHIND = os.getenv("LIKE_WRITE_BEHIND", "0") == "1"
+LIKE_FLUSH_INTERVAL_MS = int(os.getenv("LIKE_FLUSH_INTERVAL_MS", "200"))
+
+APPLY_LIKE_DELTA_SQL = text("""
+    UPDATE tb_community
+    SET like_count = GREATEST(COALESCE(like_count, 0) + :delta, 0)
+    WHERE community_no = :community_no
+""")
+
+
+class LikeBuffer:
+    """
+    (글, 사용자) 별 최종 좋아요 상태를 모아 두는 write-behind 버퍼
+    _pending 은 아직 반영 전, _inflight 는 반영 중인 상태이며 둘 다 {키: (DB 상태, 최종 상태)}
+    조회는 버퍼를 먼저 보고 없을 때만 DB 를 읽으므로, 사용자는 반영 전에도 자기 좋아요를 볼 수 있다
+    """
+
+    def __init__(self, interval_ms: int = LIKE_FLUSH_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        # 반영은 한 번에 하나만
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _buffered(self, key):
+        if key in self._pending:
+            return self._pending[key][1]
+        if key in self._inflight:
+            return self._inflight[key][1]
+        return None
+
+    def state(self, community_no: int, user_no: int):
+        """버퍼에 있는 좋아요 상태, 없으면 None (DB 값을 그대로 사용)"""
+        with self._lock:
+            return self._buffered((community_no, user_no))
+
+    def pending_delta(self, community_no: int) -> int:
+        """아직 DB 에 반영되지 않은 좋아요 수 증감"""
+        with self._lock:
+            return sum(
+                int(liked) - int(base)
+                for buffer in (self._inflight, self._pending)
+                for (post, _), (base, liked) in buffer.items()
+                if post == community_no
+            )
+
+    def pending_deltas(self) -> Counter:
+        with self._lock:
+            deltas = Counter()
+            for buffer in (self._inflight, self._pending):
+                for (post, _), (base, liked) in buffer.items():
+                    deltas[post] += int(liked) - int(base)
+            return deltas
+
+    def toggle(self, db: Session, community_no: int, user_no: int):
+        """좋아요 상태를 뒤집어 버퍼에 기록 -> (좋아요 여부, 화면에 보일 좋아요 수), 글이나 사용자가 없으면 None"""
+        key = (community_no, user_no)
+        post = db.query(
+            models.Community.like_count,
+            exists().where(models.User.user_no == user_no).label("user_exists")
+        ).filter(
+            models.Community.community_no == community_no
+        ).first()
+        if post is None or not post.user_exists:
+            return None
+
+        with self._lock:
+            current = self._buffered(key)
+        if current is None:
+            current = db.query(models.CommunityLike.like_id).filter_by(
+                community_no=community_no, user_no=user_no
+            ).first() is not None
+
+        with self._lock:
+            # DB 를 읽는 사이에 같은 키가 버퍼에 들어왔으면 버퍼 값을 기준으로 뒤집음
+            buffered = self._buffered(key)
+            if buffered is not None:
+                current = buffered
+            if key in self._pending:
+                base = self._pending[key][0]
+            elif key in self._inflight:
+                base = self._inflight[key][1]
+            else:
+                base = current
+            self._pending[key] = (base, not current)
+        return not current, max((post.like_count or 0) + self.pending_delta(community_no), 0)
+
+    def flush(self):
+        """버퍼에 쌓인 좋아요/취소를 한 트랜잭션으로 반영"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._inflight, self._pending = self._pending, {}
+                batch = self._inflight
+
+            inserts = [key for key, (base, liked) in batch.items() if liked and not base]
+            deletes = [key for key, (base, liked) in batch.items() if base and not liked]
+            db = SessionLocal()
+            try:
+                deltas = Counter()
+                if inserts:
+                    # 그 사이 삭제된 글/사용자의 좋아요는 조인으로 걸러서, 나머지 좋아요는 그대로 반영
+                    rows = values(
+                        column("community_no", Integer), column("user_no", Integer), name="pending_likes"
+                    ).data(inserts)
+                    inserted = db.execute(
+                        insert(models.CommunityLike)
+                        .from_select(
+                            ["community_no", "user_no"],
+                            select(rows.c.community_no, rows.c.user_no)
+                            .join(models.Community, models.Community.community_no == rows.c.community_no)
+                            .join(models.User, models.User.user_no == rows.c.user_no)
+                        )
+                        .on_conflict_do_nothing(index_elements=["community_no", "user_no"])
+                        .returning(models.CommunityLike.community_no)
+                    ).scalars().all()
+                    deltas.update(inserted)
+                if deletes:
+                    deleted = db.execute(
+                        delete(models.CommunityLike)
+                        .where(tuple_(models.CommunityLike.community_no, models.CommunityLike.user_no).in_(deletes))
+                        .returning(models.CommunityLike.community_no)
+                    ).scalars().all()
+                    deltas.subtract(deleted)
+
+                # 실제로 추가/삭제된 행 기준으로 글마다 한 번씩 좋아요 수 갱신
+                changed = [{"community_no": c, "delta": d} for c, d in deltas.items() if d]
+                if changed:
+                    db.execute(APPLY_LIKE_DELTA_SQL, changed)
+                db.commit()
+
+                if changed:
+                    counts = db.query(models.Community.community_no, models.Community.like_count).filter(
+                        models.Community.community_no.in_([row["community_no"] for row in changed])
+                    ).all()
+                    for community_no, like_count in counts:
+                        popular_ranking.apply_like(community_no, like_count or 0)
+            except Exception as e:
+                # 조인과 커밋 사이에 글이 삭제되어 외래 키 위반이 나도, 다음 반영 때는 조인에서 걸러지므로 재시도
+                db.rollback()
+                print(f"Like buffer flush failed, will retry: {e}")
+                with self._lock:
+                    # 실패한 배치를 되돌리되, 그 사이 새로 들어온 토글이 우선
+                    for key, (base, liked) in batch.items():
+                        if key in self._pending:
+                            self._pending[key] = (base, self._pending[key][1])
+                        else:
+                            self._pending[key] = (base, liked)
+                    self._inflight = {}
+                return
+            finally:
+                db.close()
+
+            with self._lock:
+                self._inflight = {}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="like-buffer-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """flush 스레드를 멈추고 남은 좋아요를 모두 반영"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+like_buffer = LikeBuffer() if LIKE_WRITE_BEHIND else None
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+
+# 캐시에 유지할 인기글 수와, 순위 밖으로 밀려난 글을 대신할 여유분
+POPULAR_CACHE_SIZE = int(os.getenv("POPULAR_CACHE_SIZE", "100"))
+POPULAR_CACHE_MARGIN = int(os.getenv("POPULAR_CACHE_MARGIN", "50"))
+# 다른 워커에서 생긴 변경을 반영하기 위한 전체 재계산 주기
+POPULAR_CACHE_TTL_SECONDS = int(os.getenv("POPULAR_CACHE_TTL_SECONDS", "60"))
+# hot 점수의 시간 감쇠 지수: 좋아요 수 / (경과 시간 + 2) ^ HOT_GRAVITY
+HOT_GRAVITY = 1.5
+# hot 후보로 따로 유지하는 최근 글의 범위 (이 기간 안의 글 중 hot 점수 상위)
+POPULAR_HOT_WINDOW_HOURS = int(os.getenv("POPULAR_HOT_WINDOW_HOURS", "72"))
+
+POPULAR_ORDERS = ("likes", "hot")
+
+
+def hot_score(row: dict, now: datetime) -> float:
+    regist_at = row["community_regist_at"]
+    if regist_at.tzinfo is None:
+        regist_at = regist_at.replace(tzinfo=timezone.utc)
+    age_hours = max((now - regist_at).total_seconds() / 3600, 0)
+    return (row["like_count"] or 0) / (age_hours + 2) ** HOT_GRAVITY
+
+
+class _CachedRows:
+    """한 가지 기준으로 DB 에서 적재한 후보 글들과 재계산 상태"""
+
+    def __init__(self):
+        self.rows = {}
+        self.loaded_at = None
+        # 캐시 밖 글들의 좋아요 수 상한 (적재 시점 캐시의 최솟값, 좋아요 순 후보만 사용)
+        self.floor = 0
+        # 조건에 맞는 글이 모두 캐시에 들어있는지 여부
+        self.complete = False
+        self.dirty = True
+        # 무효화될 때마다 증가 (재계산 쿼리 도중의 무효화를 놓치지 않기 위함)
+        self.generation = 0
+
+    def invalidate(self):
+        self.dirty = True
+        self.generation += 1
+
+    def stale_generation(self, ttl_seconds: int):
+        """재계산이 필요하면 현재 세대 번호, 아니면 None"""
+        expired = self.loaded_at is None or time.monotonic() - self.loaded_at > ttl_seconds
+        return self.generation if self.dirty or expired else None
+
+    def install(self, posts: list, generation: int, capacity: int):
+        self.rows = {post["community_no"]: post for post in posts}
+        self.complete = len(posts) < capacity
+        self.floor = (posts[-1]["like_count"] or 0) if posts else 0
+        self.loaded_at = time.monotonic()
+        # 쿼리하는 사이에 무효화되었으면 다음 조회에서 다시 계산
+        if self.generation == generation:
+            self.dirty = False
+
+
+class PopularRanking:
+    """
+    인기글 순위 캐시
+    likes 는 좋아요 수 상위 글, hot 은 여기에 최근 POPULAR_HOT_WINDOW_HOURS 안의 hot 점수 상위 글을 더한 후보에서 순위를 매긴다
+    (좋아요가 빠르게 느는 새 글이 전체 기간 좋아요 상위에 들기 전에도 hot 에 나오도록)
+    좋아요 토글은 apply_like 로 캐시를 직접 갱신하고, 캐시 밖의 글이 순위에 들어올 수 있을 때만 다음 조회에서 재계산한다
+    """
+
+    def __init__(self, size: int = POPULAR_CACHE_SIZE, margin: int = POPULAR_CACHE_MARGIN,
+                 ttl_seconds: int = POPULAR_CACHE_TTL_SECONDS):
+        self.size = size
+        self.capacity = size + margin
+        self.ttl_seconds = ttl_seconds
+        # 캐시 상태는 flush 스레드(좋아요 write-behind)에서도 갱신하므로 threading 잠금 사용, DB 를 기다리는 동안에는 잡지 않음
+        self._lock = threading.Lock()
+        # 재계산은 한 번에 하나의 요청만
+        self._refresh_lock = asyncio.Lock()
+        self._likes = _CachedRows()
+        self._hot = _CachedRows()
+
+    def _stale_generation(self, cached: _CachedRows):
+        with self._lock:
+            return cached.stale_generation(self.ttl_seconds)
+
+    @staticmethod
+    def _select_posts():
+        return (
+            select(
+                models.Community.community_no,
+                models.Community.community_title,
+                models.Community.community_content,
+                models.Community.user_no,
+                models.Community.community_regist_at,
+                models.Community.like_count,
+                models.Community.comment_count,
+                models.User.user_nickname.label("user_nickname")
+            )
+            .join(models.User, models.Community.user_no == models.User.user_no)
+        )
+
+    async def _load_likes(self, db: AsyncSession):
+        posts = (await db.execute(
+            self._select_posts()
+            .order_by(models.Community.like_count.desc(), models.Community.community_no.desc())
+            .limit(self.capacity)
+        )).all()
+        return [dict(post._mapping) for post in posts]
+
+    async def _load_hot(self, db: AsyncSession):
+        # hot_score 와 같은 식을 DB 에서 계산 (최근 글 범위는 ix_tb_community_regist_at_no 인덱스 사용)
+        age_hours = func.greatest(
+            func.extract("epoch", func.now() - models.Community.community_regist_at) / 3600, 0
+        )
+        score = func.coalesce(models.Community.like_count, 0) / func.power(age_hours + 2, HOT_GRAVITY)
+        posts = (await db.execute(
+            self._select_posts()
+            .where(models.Community.community_regist_at >= func.now() - timedelta(hours=POPULAR_HOT_WINDOW_HOURS))
+            .order_by(score.desc(), models.Community.community_no.desc())
+            .limit(self.capacity)
+        )).all()
+        return [dict(post._mapping) for post in posts]
+
+    async def _refresh(self, db: AsyncSession, cached: _CachedRows, load):
+        if self._stale_generation(cached) is not None:
+            async with self._refresh_lock:
+                generation = self._stale_generation(cached)
+                if generation is not None:
+                    posts = await load(db)
+                    with self._lock:
+                        cached.install(posts, generation, self.capacity)
+
+    async def top(self, db: AsyncSession, limit: int, order: str = "likes"):
+        await self._refresh(db, self._likes, self._load_likes)
+        if order == "hot":
+            await self._refresh(db, self._hot, self._load_hot)
+        with self._lock:
+            # hot 은 좋아요 상위 글과 최근 hot 상위 글을 합쳐서 정렬 (같은 글은 한 번만)
+            rows = {**self._likes.rows, **self._hot.rows} if order == "hot" else dict(self._likes.rows)
+            rows = [dict(row) for row in rows.values()]
+
+        if order == "hot":
+            now = datetime.now(timezone.utc)
+            rows.sort(key=lambda row: hot_score(row, now), reverse=True)
+        else:
+            rows.sort(key=lambda row: (row["like_count"] or 0, row["community_no"]), reverse=True)
+        return rows[:min(limit, self.size)]
+
+    def apply_like(self, community_no: int, like_count: int):
+        with self._lock:
+            likes, hot = self._likes, self._hot
+            row = likes.rows.get(community_no)
+            if row is not None:
+                row["like_count"] = like_count
+                # 캐시 밖의 글보다 낮아졌을 수 있으면 재계산
+                if not likes.complete and like_count < likes.floor:
+                    likes.invalidate()
+            elif likes.complete or like_count > likes.floor:
+                # 캐시 밖의 글이 순위 안으로 들어옴
+                likes.invalidate()
+
+            row = hot.rows.get(community_no)
+            if row is not None:
+                row["like_count"] = like_count
+            elif not hot.complete and hot.rows:
+                # 후보 밖의 최근 글이 빠르게 좋아요를 받고 있을 수 있음 (최근 글이 모두 후보면 범위 밖의 오래된 글)
+                # 막 쓴 글이라도 점수는 좋아요 수 / 2 ^ HOT_GRAVITY 를 넘지 못하므로, 후보의 최저 점수보다 높을 수 있을 때만 재계산
+                now = datetime.now(timezone.utc)
+                if like_count / 2 ** HOT_GRAVITY > min(hot_score(r, now) for r in hot.rows.values()):
+                    hot.invalidate()
+
+    def apply_comment_count(self, community_no: int, comment_count: int):
+        with self._lock:
+            for cached in (self._likes, self._hot):
+                row = cached.rows.get(community_no)
+                if row is not None:
+                    row["comment_count"] = comment_count
+
+    def notify_created(self):
+        with self._lock:
+            # 새 글(좋아요 0)이 순위에 들어갈 수 있는 경우만 재계산
+            if self._likes.complete or self._likes.floor <= 0:
+                self._likes.invalidate()
+            # 새 글은 항상 최근 글 범위 안
+            if self._hot.complete:
+                self._hot.invalidate()
+
+    def invalidate_post(self, community_no: int):
+        with self._lock:
+            for cached in (self._likes, self._hot):
+                if community_no in cached.rows:
+                    cached.invalidate()
+
+
+popular_ranking = PopularRanking()
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import readiness
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+# 프로세스 생존 확인 (서브시스템 준비 여부와 무관하게 200)
+@router.get("")
+def health():
+    return {
+        "status": "ok",
+        "startup_mode": readiness.STARTUP_MODE,
+        "subsystems": readiness.report()
+    }
+
+# 준비 상태 확인 (모든 서브시스템이 로딩되기 전에는 503, lazy 모드는 첫 요청에서 로딩하므로 항상 준비됨)
+@router.get("/ready")
+def health_ready():
+    ready = readiness.STARTUP_MODE == "lazy" or readiness.all_ready()
+    return JSONResponse(
+        {"ready": ready, "subsystems": readiness.report()},
+        status_code=200 if ready else 503
+    )
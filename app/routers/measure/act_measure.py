@@ -1,15 +1,26 @@
-from fastapi import APIRouter, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import numpy as np
 import cv2, base64
-from ultralytics import YOLO
 import math
 import os
+import time
+from functools import lru_cache
+from uuid import uuid4
+from app import readiness
+from app.routers.measure.detector import BatchInferenceEngine, create_detector
 
 router = APIRouter()
 
-# YOLO 모델 설정 (사람 감지)
-person_model = YOLO("yolov8s.pt", task="detect")
+# 사람 감지 YOLO 검출기 (MEASURE_DETECTOR_BACKEND 로 ultralytics / onnx / openvino 선택,
+# MEASURE_DETECTOR_WORKERS > 0 이면 워커 프로세스 풀에서 모델 로딩)
+# 동시 요청을 마이크로 배치로 묶어 이벤트 루프 밖에서 추론
+inference_engine = BatchInferenceEngine(create_detector())
+detector_subsystem = readiness.register("detector", inference_engine.start)
+# 검출 워커가 죽으면 /health/ready 에 실패로 보이고, 다음 요청이 새 워커 풀을 다시 워밍업
+inference_engine.on_detector_lost = detector_subsystem.mark_failed
 
 # 허용 기울기 범위 (±5도)
 MAX_PITCH_DEG = 5.0  
@@ -24,16 +35,142 @@ else:
     cam_mtx = None
     cam_dist = None
 
+# 해상도별 왜곡 보정 remap 테이블 캐시 크기
+UNDISTORT_CACHE_SIZE = int(os.getenv("MEASURE_UNDISTORT_CACHE_SIZE", "8"))
+# 고정소수점(CV_16SC2) 맵 사용 여부 (cv2.undistort 내부와 동일한 정밀도, 0이면 float 맵)
+UNDISTORT_FIXED_POINT = os.getenv("MEASURE_UNDISTORT_FIXED_POINT", "1") == "1"
+
+# 검출용 축소 디코딩 배율 (1이면 원본 해상도로 검출)
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+DETECT_SCALE = int(os.getenv("MEASURE_DETECT_SCALE", "1"))
+# 축소 검출 후 두 사람 영역만 원본 해상도로 다시 검출할지 여부 (정밀도 ↔ 비용 선택, 기본 끔)
+# 켜면 원본 해상도로 한 번 디코딩해 검출용 이미지는 resize 로 만들므로,
+# 축소 디코딩의 메모리/디코딩 시간 절감은 없어지고 검출 연산 절감만 남음
+REFINE_BOXES = os.getenv("MEASURE_REFINE_BOXES", "0") == "1"
+# 재검출 영역 여백 (박스 크기 대비 비율)
+REFINE_MARGIN = 0.1
+# 재검출 박스를 채택할 최소 IoU
+REFINE_MIN_IOU = 0.3
+
+@lru_cache(maxsize=UNDISTORT_CACHE_SIZE)
+def get_undistort_maps(width: int, height: int, scale: int = 1):
+    # 축소 디코딩한 이미지는 카메라 행렬(fx, fy, cx, cy)도 같은 배율로 축소
+    mtx = cam_mtx.copy()
+    mtx[:2] /= scale
+    map_type = cv2.CV_16SC2 if UNDISTORT_FIXED_POINT else cv2.CV_32FC1
+    return cv2.initUndistortRectifyMap(mtx, cam_dist, None, mtx, (width, height), map_type)
+
+# 왜곡 보정 (해상도별로 한 번 만든 remap 테이블 재사용)
+def undistort(img: np.ndarray, scale: int = 1) -> np.ndarray:
+    height, width = img.shape[:2]
+    map1, map2 = get_undistort_maps(width, height, scale)
+    return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
+
+# 검출용 이미지 디코딩 + 왜곡 보정
+def decode_image(data: bytes, scale: int = 1):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_DECODE_FLAGS[scale])
+    if img is not None and cam_mtx is not None and cam_dist is not None:
+        img = undistort(img, scale)
+    return img
+
+# 재검출용: 원본 해상도로 한 번만 디코딩하고, 검출용 이미지는 축소 디코딩과 같은 크기로 resize
+# 반환: (검출용 이미지, 왜곡 보정 전 원본 해상도 이미지)
+def decode_full_and_reduced(data: bytes, scale: int):
+    full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if full is None:
+        return None, None
+    height, width = full.shape[:2]
+    img = cv2.resize(full, (-(-width // scale), -(-height // scale)), interpolation=cv2.INTER_AREA)
+    if cam_mtx is not None and cam_dist is not None:
+        img = undistort(img, scale)
+    return img, full
+
+# 원본 해상도에서 박스 주변만 잘라내고, 그 영역만 왜곡 보정
+def crop_full_resolution(full: np.ndarray, box: np.ndarray):
+    height, width = full.shape[:2]
+    x1, y1, x2, y2 = box
+    mx = (x2 - x1) * REFINE_MARGIN
+    my = (y2 - y1) * REFINE_MARGIN
+    cx1, cy1 = max(int(x1 - mx), 0), max(int(y1 - my), 0)
+    cx2, cy2 = min(int(x2 + mx) + 1, width), min(int(y2 + my) + 1, height)
+    if cam_mtx is not None and cam_dist is not None:
+        map1, map2 = get_undistort_maps(width, height)
+        crop = cv2.remap(full, map1[cy1:cy2, cx1:cx2], map2[cy1:cy2, cx1:cx2], cv2.INTER_LINEAR)
+    else:
+        crop = full[cy1:cy2, cx1:cx2].copy()
+    return crop, np.array([cx1, cy1, cx1, cy1], dtype=np.float32)
+
+def full_resolution_crops(full: np.ndarray, boxes):
+    return [crop_full_resolution(full, box) for box in boxes]
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> float:
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+# 축소 검출 박스를 원본 해상도 재검출 결과로 보정 (겹치는 사람이 없으면 기존 박스 유지)
+async def refine_boxes(full: np.ndarray, coarse_boxes):
+    crops = await run_in_threadpool(full_resolution_crops, full, coarse_boxes)
+    detections = await asyncio.gather(*(inference_engine.detect(crop) for crop, _ in crops))
+
+    refined = []
+    for coarse, (_, offset), (boxes, clss, _) in zip(coarse_boxes, crops, detections):
+        best, best_iou = coarse, REFINE_MIN_IOU
+        for i in np.where(clss == 0)[0]:
+            candidate = boxes[i] + offset
+            iou = box_iou(coarse, candidate)
+            if iou > best_iou:
+                best, best_iou = candidate, iou
+        refined.append(best)
+    return refined
+
+# 결과 이미지 반환 방식
+#   base64: JSON 본문에 base64 문자열로 포함 (기존 방식)
+#   url:    짧은 TTL의 조회 URL만 반환, 이미지는 별도 GET 으로 바이너리 전송
+#   boxes:  박스 좌표만 반환 (클라이언트에서 직접 그림)
+#   none:   결과 이미지 없음
+ANNOTATION_MODES = ("base64", "url", "boxes", "none")
+ANNOTATION_TTL_SECONDS = int(os.getenv("MEASURE_ANNOTATION_TTL_SECONDS", "60"))
+ANNOTATION_MAX_ITEMS = int(os.getenv("MEASURE_ANNOTATION_MAX_ITEMS", "256"))
+
+# 결과 이미지 임시 저장소 (token -> (만료 시각, JPEG 바이트))
+# 잠금 없이 쓰므로 이벤트 루프에서만 접근 (스레드풀에서 실행되는 sync 핸들러에서 건드리지 않음)
+annotated_images = {}
+
+def store_annotated_image(jpeg: bytes) -> str:
+    now = time.monotonic()
+    for token in [t for t, (expires_at, _) in annotated_images.items() if expires_at <= now]:
+        annotated_images.pop(token, None)
+    # 용량 초과 시 가장 먼저 저장된 것부터 제거
+    while len(annotated_images) >= ANNOTATION_MAX_ITEMS:
+        annotated_images.pop(next(iter(annotated_images)))
+    token = uuid4().hex
+    annotated_images[token] = (now + ANNOTATION_TTL_SECONDS, jpeg)
+    return token
+
+# JPEG 인코딩 함수
+def encode_jpeg(img: np.ndarray) -> bytes:
+    _, buf = cv2.imencode('.jpg', img)
+    return buf.tobytes()
+
 # Base64 인코딩 함수
 def encode_b64(img: np.ndarray) -> str:
-    _, buf = cv2.imencode('.jpg', img)
-    return base64.b64encode(buf).decode('utf-8')
+    return base64.b64encode(encode_jpeg(img)).decode('utf-8')
 
-@router.post("/estimate-child-height")
+@router.post("/estimate-child-height", dependencies=[Depends(readiness.require("detector"))])
 async def estimate_child_height(
     ref_height: float = Form(...),         # 기준 사람람 실제 키 (cm)
     camera_pitch: float = Form(...),       # pitch 값 (deg)
-    image: UploadFile = File(...)          # 이미지 파일
+    image: UploadFile = File(...),         # 이미지 파일
+    detect_scale: int = Form(DETECT_SCALE),# 검출용 축소 배율 (1, 2, 4, 8)
+    annotation: str = Form("base64")       # 결과 이미지 반환 방식 (base64, url, boxes, none)
 ):
     # 1) pitch 유효성 확인
     if abs(camera_pitch) > MAX_PITCH_DEG:
@@ -42,21 +179,30 @@ async def estimate_child_height(
              "error": f"기울기가 너무 큽니다: {camera_pitch:.1f}° (허용 ±{MAX_PITCH_DEG}°)"},
             status_code=400
         )
+    if detect_scale not in REDUCED_DECODE_FLAGS:
+        return JSONResponse(
+            {"success": False, "error": f"지원하지 않는 검출 배율입니다: {detect_scale}"},
+            status_code=400
+        )
+    if annotation not in ANNOTATION_MODES:
+        return JSONResponse(
+            {"success": False, "error": f"지원하지 않는 결과 이미지 방식입니다: {annotation}"},
+            status_code=400
+        )
 
-    # 2) 이미지 디코딩
+    # 2) 이미지 디코딩 + 3) 왜곡 보정 (검출 배율로 축소 디코딩, 재검출 시에는 원본을 한 번만 디코딩해 재사용)
     data = await image.read()
-    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    refine = detect_scale > 1 and REFINE_BOXES
+    full = None
+    if refine:
+        img, full = await run_in_threadpool(decode_full_and_reduced, data, detect_scale)
+    else:
+        img = await run_in_threadpool(decode_image, data, detect_scale)
     if img is None:
         return JSONResponse({"success": False, "error": "이미지 디코딩 실패"}, status_code=400)
-    
-    # 3) 왜곡 보정
-    if cam_mtx is not None and cam_dist is not None:
-        img = cv2.undistort(img, cam_mtx, cam_dist)
 
     # 4) 사람 검출
-    res = person_model(img, conf=0.1)[0]
-    boxes = res.boxes.xyxy.cpu().numpy()
-    clss = res.boxes.cls.cpu().numpy().astype(int)
+    boxes, clss, _ = await inference_engine.detect(img)
     idxs = np.where(clss == 0)[0]
     if idxs.size < 2:
         return JSONResponse({"success": False, "error": "두 사람 미검출"}, status_code=400)
@@ -64,14 +210,25 @@ async def estimate_child_height(
     # 5) 픽셀 높이 기준 정렬
     heights = [(i, boxes[i, 3] - boxes[i, 1]) for i in idxs]
     heights.sort(key=lambda x: x[1], reverse=True)
-    ref_i, ref_px = heights[0]
-    child_i, child_px = heights[1]
+    ref_i = heights[0][0]
+    child_i = heights[1][0]
+
+    # 원본 해상도 좌표로 환산 후, 축소 검출이면 두 사람 영역만 원본 해상도로 재검출
+    ref_box = boxes[ref_i] * detect_scale
+    child_box = boxes[child_i] * detect_scale
+    full_height = img.shape[0] * detect_scale
+    if refine:
+        full_height = full.shape[0]
+        ref_box, child_box = await refine_boxes(full, [ref_box, child_box])
+        full = None
+    ref_px = float(ref_box[3] - ref_box[1])
+    child_px = float(child_box[3] - child_box[1])
 
     # 6) focal length (fy) 계산
     if cam_mtx is not None:
         f_px = cam_mtx[1, 1]  # 세로 방향 focal length
     else:
-        f_px = img.shape[0] / 2  # 기본 focal length 추정
+        f_px = full_height / 2  # 기본 focal length 추정
 
     # 7) 기준 사람의 거리리까지 거리 추정
     D_ref = (f_px * ref_height) / ref_px
@@ -81,16 +238,36 @@ async def estimate_child_height(
     pitch_rad = math.radians(camera_pitch)
     child_height = raw_child_height / math.cos(pitch_rad)
 
-    # 9) 결과 이미지 생성
-    ann = img.copy()
-    for idx, color in [(ref_i, (0, 0, 255)), (child_i, (255, 0, 0))]:
-        x1, y1, x2, y2 = boxes[idx].astype(int)
-        cv2.rectangle(ann, (x1, y1), (x2, y2), color, 3)
-    b64_ann = encode_b64(ann)
-
-    return JSONResponse({
+    result = {
         "success": True,
         "distance_dad_cm": round(D_ref, 1),
         "child_height_cm": round(child_height, 1),
-        "annotated_image": b64_ann
-    })
+        # 원본 해상도 기준 박스 좌표 [x1, y1, x2, y2]
+        "ref_box": [round(float(v), 1) for v in ref_box],
+        "child_box": [round(float(v), 1) for v in child_box],
+    }
+
+    # 9) 결과 이미지 생성 (검출 해상도 이미지 위에 표시, img는 이후 사용하지 않으므로 복사 없이 그림)
+    if annotation in ("base64", "url"):
+        for box, color in [(ref_box, (0, 0, 255)), (child_box, (255, 0, 0))]:
+            x1, y1, x2, y2 = (box / detect_scale).astype(int)
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
+        if annotation == "base64":
+            result["annotated_image"] = await run_in_threadpool(encode_b64, img)
+        else:
+            token = store_annotated_image(await run_in_threadpool(encode_jpeg, img))
+            result["annotated_image_url"] = f"/estimate-child-height/annotated/{token}"
+
+    return JSONResponse(result)
+
+@router.get("/estimate-child-height/annotated/{token}")
+async def get_annotated_image(token: str):
+    entry = annotated_images.get(token)
+    if entry is None or entry[0] <= time.monotonic():
+        annotated_images.pop(token, None)
+        raise HTTPException(status_code=404, detail="결과 이미지가 없거나 만료되었습니다.")
+    return Response(
+        content=entry[1],
+        media_type="image/jpeg",
+        headers={"Cache-Control": f"private, max-age={ANNOTATION_TTL_SECONDS}"}
+    )
@@ -1,7 +1,17 @@
 import os
-import pandas as pd
-from fastapi import APIRouter, HTTPException
-from app.schemas import CompareRequest
+from datetime import datetime
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app import readiness
+from app.database import get_db
+from app.models import KidInfo, Measure
+from app.schemas import CompareRequest, CompareBatchRequest
+from app.routers.measure.growth_reference import (
+    GrowthReference, HEIGHT, WEIGHT, BMI, MEDIAN_INDEX,
+    percentile_from_value, lookup_curves, batch_percentiles
+)
 
 router = APIRouter()
 
@@ -11,56 +21,26 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 # 엑셀 파일의 절대 경로
 excel_file_path = os.path.join(current_dir, "height_weight_data.xlsx")
 
-# 엑셀 데이터 읽기
-try:
-    # 연령별 신장 데이터 처리
-    height_data_df = pd.read_excel(excel_file_path, sheet_name="연령별 신장")
-    height_data_df = height_data_df.dropna(subset=["만나이(개월)", "성별"])
-    #print("height_data 열 이름:", height_data_df.columns)  # 열 이름 출력
-
-    # 연령별 체중 데이터 처리
-    weight_data_df = pd.read_excel(excel_file_path, sheet_name="연령별 체중")
-    weight_data_df = weight_data_df.dropna(subset=["만나이(개월)", "성별"])
-    #print("weight_data 열 이름:", weight_data_df.columns)  # 열 이름 출력
-
-    # 연령별 체질량지수(BMI) 데이터 처리
-    bmi_data_df = pd.read_excel(excel_file_path, sheet_name="연령별 체질량지수")
-    bmi_data_df = bmi_data_df.dropna(subset=["만나이(개월)", "성별"])
-    #print("BMI 데이터 열 이름:", bmi_data_df.columns)  # 열 이름 출력
-
-    # 평균 및 백분위수 데이터(기존 로직 호환용)
-    def make_dict(df, value_cols):
-        temp = df[["만나이(개월)", "성별"] + value_cols]
-        temp = temp.groupby(["만나이(개월)", "성별"]).mean().reset_index()
-        return temp.set_index(["만나이(개월)", "성별"]).to_dict("index")
-
-    height_data = make_dict(height_data_df, ["신장(cm) 백분위수", "신장(cm) 표준점수", "Unnamed: 12"])
-    weight_data = make_dict(weight_data_df, ["체중(kg) 백분위수", "체중(kg) 표준점수", "Unnamed: 12"])
-    bmi_data = make_dict(bmi_data_df, ["체질량지수(kg/m2) 백분위수", "체질량지수(kg/m2) 표준점수", "Unnamed: 12"])
-
-except Exception as e:
-    raise RuntimeError(f"엑셀 데이터를 읽는 중 오류가 발생했습니다: {e}")
-
-def get_50th(row):
-    if "Unnamed: 12" in row:
-        return row["Unnamed: 12"]
-    raise HTTPException(status_code=500, detail="중앙값(50th) 컬럼이 없습니다.")
-
-def get_percentile_from_value(percentile_points, value_points, value):
-    for i in range(len(value_points) - 1):
-        if value_points[i] <= value <= value_points[i+1]:
-            # 선형 보간
-            x0, x1 = value_points[i], value_points[i+1]
-            y0, y1 = percentile_points[i], percentile_points[i+1]
-            if x1 == x0:
-                return y0
-            return y0 + (value - x0) * (y1 - y0) / (x1 - x0)
-    if value < value_points[0]:
-        return percentile_points[0]
-    if value > value_points[-1]:
-        return percentile_points[-1]
-    return None
-@router.post("/compare")
+# 파싱된 기준표 바이너리 캐시 위치 (기본값: 엑셀과 같은 디렉토리)
+cache_dir = os.getenv("GROWTH_REFERENCE_CACHE_DIR", current_dir)
+
+# 컴파일된 성장 기준표 (성별, 개월 수, 지표) -> 백분위 곡선
+growth_reference = None
+
+# 엑셀 데이터 읽기 (엑셀이 바뀌지 않았으면 바이너리 캐시를 메모리 매핑, 시작 모드에 따라 지연 로딩)
+def load_growth_data():
+    global growth_reference
+    try:
+        growth_reference = GrowthReference.load(excel_file_path, cache_dir)
+    except Exception as e:
+        raise RuntimeError(f"엑셀 데이터를 읽는 중 오류가 발생했습니다: {e}")
+
+async def _load_growth_reference():
+    await run_in_threadpool(load_growth_data)
+
+readiness.register("growth_reference", _load_growth_reference)
+
+@router.post("/compare", dependencies=[Depends(readiness.require("growth_reference"))])
 def compare_kid_data(request: CompareRequest):
     try:
         print("요청 데이터:", request.dict())
@@ -74,14 +54,13 @@ def compare_kid_data(request: CompareRequest):
         if age <= 0 or height <= 0 or weight <= 0:
             raise HTTPException(status_code=400, detail="유효하지 않은 입력 값입니다.")
 
-        # 개월 수에 맞는 데이터 검증
-        if (age, gender) not in height_data or (age, gender) not in weight_data or (age, gender) not in bmi_data:
+        # 개월 수에 맞는 데이터 검증 (신장/체중/BMI 백분위 곡선)
+        curves = growth_reference.curves(gender, age)
+        if curves is None:
             raise HTTPException(status_code=404, detail="해당 나이와 성별에 대한 데이터가 없습니다.")
 
         # 평균 신장, 체중, BMI 가져오기 (중앙값)
-        average_height = get_50th(height_data[(age, gender)])
-        average_weight = get_50th(weight_data[(age, gender)])
-        average_bmi = get_50th(bmi_data[(age, gender)])
+        average_height, average_weight, average_bmi = (float(v) for v in curves[:, MEDIAN_INDEX])
 
         # 아이의 키, 몸무게, BMI와 평균 비교
         height_difference = height - average_height
@@ -89,71 +68,10 @@ def compare_kid_data(request: CompareRequest):
         bmi = weight / ((height / 100) ** 2)  # BMI 계산
         bmi_difference = bmi - average_bmi
 
-        # 백분위수별 값 리스트 정의
-        percentile_points = [3, 5, 10, 15, 25, 50, 75, 85, 90, 95, 97, 99]
-
-        # 키 백분위수 계산
-        row_h = height_data_df[(height_data_df["만나이(개월)"] == age) & (height_data_df["성별"] == gender)]
-        if row_h.empty:
-            raise HTTPException(status_code=404, detail="키 데이터 없음")
-        height_value_points = [
-            
-            float(row_h["Unnamed: 7"].values[0]), # 3th
-            float(row_h["Unnamed: 8"].values[0]), # 5th
-            float(row_h["Unnamed: 9"].values[0]), # 10th
-            float(row_h["Unnamed: 10"].values[0]), # 15th
-            float(row_h["Unnamed: 11"].values[0]), # 25th
-            float(row_h["Unnamed: 12"].values[0]), # 50th
-            float(row_h["Unnamed: 13"].values[0]), # 75th
-            float(row_h["Unnamed: 14"].values[0]), # 85th
-            float(row_h["Unnamed: 15"].values[0]), # 90th
-            float(row_h["Unnamed: 16"].values[0]), # 95th
-            float(row_h["Unnamed: 17"].values[0]), # 97th
-            float(row_h["Unnamed: 18"].values[0]), # 99th
-        ]
-        height_percentile = get_percentile_from_value(percentile_points, height_value_points, height)
-
-        # 몸무게 백분위수 계산
-        row_w = weight_data_df[(weight_data_df["만나이(개월)"] == age) & (weight_data_df["성별"] == gender)]
-        if row_w.empty:
-            raise HTTPException(status_code=404, detail="몸무게 데이터 없음")
-        weight_value_points = [
-            
-            float(row_w["Unnamed: 7"].values[0]), # 3th
-            float(row_w["Unnamed: 8"].values[0]), # 5th
-            float(row_w["Unnamed: 9"].values[0]), # 10th
-            float(row_w["Unnamed: 10"].values[0]), # 15th
-            float(row_w["Unnamed: 11"].values[0]), # 25th
-            float(row_w["Unnamed: 12"].values[0]), # 50th
-            float(row_w["Unnamed: 13"].values[0]), # 75th
-            float(row_w["Unnamed: 14"].values[0]), # 85th
-            float(row_w["Unnamed: 15"].values[0]), # 90th
-            float(row_w["Unnamed: 16"].values[0]), # 95th
-            float(row_w["Unnamed: 17"].values[0]), # 97th
-            float(row_w["Unnamed: 18"].values[0]), # 99th
-        ]
-        weight_percentile = get_percentile_from_value(percentile_points, weight_value_points, weight)
-
-        # BMI 백분위수 계산
-        row_b = bmi_data_df[(bmi_data_df["만나이(개월)"] == age) & (bmi_data_df["성별"] == gender)]
-        if row_b.empty:
-            raise HTTPException(status_code=404, detail="BMI 데이터 없음")
-        bmi_value_points = [
-            
-            float(row_b["Unnamed: 7"].values[0]), # 3th
-            float(row_b["Unnamed: 8"].values[0]), # 5th
-            float(row_b["Unnamed: 9"].values[0]), # 10th
-            float(row_b["Unnamed: 10"].values[0]), # 15th
-            float(row_b["Unnamed: 11"].values[0]), # 25th
-            float(row_b["Unnamed: 12"].values[0]), # 50th
-            float(row_b["Unnamed: 13"].values[0]), # 75th
-            float(row_b["Unnamed: 14"].values[0]), # 85th
-            float(row_b["Unnamed: 15"].values[0]), # 90th
-            float(row_b["Unnamed: 16"].values[0]), # 95th
-            float(row_b["Unnamed: 17"].values[0]), # 97th
-            float(row_b["Unnamed: 18"].values[0]), # 99th
-        ]
-        bmi_percentile = get_percentile_from_value(percentile_points, bmi_value_points, bmi)
+        # 백분위수 계산
+        height_percentile = percentile_from_value(curves[HEIGHT], height)
+        weight_percentile = percentile_from_value(curves[WEIGHT], weight)
+        bmi_percentile = percentile_from_value(curves[BMI], bmi)
 
         # 결과 반환
         return {
@@ -172,7 +90,96 @@ def compare_kid_data(request: CompareRequest):
             "weightPercentile": round(weight_percentile, 1),
             "bmiPercentile": round(bmi_percentile, 1),
         }
+    except HTTPException:
+        raise
     except ZeroDivisionError:
         raise HTTPException(status_code=400, detail="키 값이 0이거나 잘못된 값입니다.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+
+# 생년월일(YYYY-MM-DD) 기준 만 나이(개월) (앱의 계산 방식과 동일)
+def months_between(birthday: datetime, at: datetime) -> int:
+    months = (at.year - birthday.year) * 12 + (at.month - birthday.month)
+    if at.day < birthday.day:
+        months -= 1
+    return months
+
+# 아이의 측정 기록을 비교용 관측치로 변환 (체중은 측정 기록에 없으므로 등록된 체중 사용)
+def load_kid_observations(kid_info_no: int, db: Session):
+    kid = db.query(KidInfo).filter(KidInfo.kid_info_no == kid_info_no).first()
+    if not kid:
+        raise HTTPException(status_code=404, detail="아이 정보를 찾을 수 없습니다.")
+    try:
+        birthday = datetime.strptime(kid.kid_birthday[:10], "%Y-%m-%d")
+        weight = float(kid.kid_weight)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="아이의 생년월일 또는 체중 형식이 올바르지 않습니다.")
+    gender = 1 if kid.kid_gender == "M" else 2
+
+    measures = (
+        db.query(Measure.measure_no, Measure.measure_height, Measure.measure_regist_at)
+        .filter(Measure.kid_info_no == kid_info_no)
+        .order_by(Measure.measure_regist_at)
+        .all()
+    )
+    observations, extras = [], []
+    for m in measures:
+        try:
+            height = float(m.measure_height)
+        except (TypeError, ValueError):
+            continue
+        observations.append((months_between(birthday, m.measure_regist_at), height, weight, gender))
+        extras.append({"measure_no": m.measure_no, "measure_regist_at": m.measure_regist_at})
+    return observations, extras
+
+@router.post("/compare/batch", dependencies=[Depends(readiness.require("growth_reference"))])
+def compare_kid_data_batch(request: CompareBatchRequest, db: Session = Depends(get_db)):
+    if request.kid_info_no is not None:
+        observations, extras = load_kid_observations(request.kid_info_no, db)
+    elif request.observations:
+        observations = [(o.ageInMonths, o.height, o.weight, o.gender) for o in request.observations]
+        extras = [{} for _ in observations]
+    else:
+        raise HTTPException(status_code=400, detail="observations 또는 kid_info_no가 필요합니다.")
+    if not observations:
+        return {"results": []}
+
+    # 전체 관측치를 한 번에 조회/계산
+    ages, heights, weights, genders = (np.array(col) for col in zip(*observations))
+    ages, genders = ages.astype(int), genders.astype(int)
+    heights, weights = heights.astype(np.float64), weights.astype(np.float64)
+
+    curves, valid = lookup_curves(growth_reference, genders, ages)
+    valid &= (ages > 0) & (heights > 0) & (weights > 0)
+    bmis = np.divide(weights, (heights / 100) ** 2, out=np.zeros_like(weights), where=heights > 0)
+    averages = curves[:, :, MEDIAN_INDEX]
+    height_percentiles = batch_percentiles(curves[:, HEIGHT], heights)
+    weight_percentiles = batch_percentiles(curves[:, WEIGHT], weights)
+    bmi_percentiles = batch_percentiles(curves[:, BMI], bmis)
+
+    results = []
+    for i, extra in enumerate(extras):
+        item = {"index": i, **extra}
+        if not valid[i]:
+            item["error"] = "해당 나이와 성별에 대한 데이터가 없거나 입력 값이 유효하지 않습니다."
+            results.append(item)
+            continue
+        average_height, average_weight, average_bmi = (float(v) for v in averages[i])
+        item.update({
+            "age": int(ages[i]),
+            "gender": "남자" if genders[i] == 1 else "여자",
+            "height": round(float(heights[i]), 1),
+            "weight": round(float(weights[i]), 1),
+            "bmi": round(float(bmis[i]), 1),
+            "averageHeight": round(average_height, 1),
+            "averageWeight": round(average_weight, 1),
+            "averageBMI": round(average_bmi, 1),
+            "heightDifference": round(float(heights[i]) - average_height, 1),
+            "weightDifference": round(float(weights[i]) - average_weight, 1),
+            "bmiDifference": round(float(bmis[i]) - average_bmi, 1),
+            "heightPercentile": round(float(height_percentiles[i]), 1),
+            "weightPercentile": round(float(weight_percentiles[i]), 1),
+            "bmiPercentile": round(float(bmi_percentiles[i]), 1),
+        })
+        results.append(item)
+    return {"results": results}
@@ -0,0 +1,271 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+from app.routers.measure.detector_backends import DETECTOR_BACKEND, load_backend
+
+# 사람 검출 신뢰도 임계값
+DETECT_CONF = 0.1
+
+# 검출 워커 프로세스 수 (0이면 API 프로세스 안의 추론 스레드 사용)
+DETECTOR_WORKERS = int(os.getenv("MEASURE_DETECTOR_WORKERS", "0"))
+
+# 마이크로 배치 설정 (최대 배치 크기, 첫 프레임 이후 최대 대기 시간)
+BATCH_MAX_SIZE = int(os.getenv("MEASURE_BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.getenv("MEASURE_BATCH_MAX_WAIT_MS", "20"))
+
+# 워밍업용 더미 프레임 크기
+WARMUP_SHAPE = (640, 640, 3)
+
+
+def _load_model(backend: str):
+    model = load_backend(backend)
+    # 첫 추론의 초기화 비용을 시작 시점에 미리 지불
+    model.predict([np.zeros(WARMUP_SHAPE, np.uint8)], DETECT_CONF)
+    return model
+
+
+def _run_model(model, images):
+    return model.predict(images, DETECT_CONF)
+
+
+# ---- 워커 프로세스 측 ----
+_worker_model = None
+_stale_handles = []
+_ready_barrier = None
+
+
+def _init_worker(backend: str, ready_barrier):
+    global _worker_model, _ready_barrier
+    _ready_barrier = ready_barrier
+    _worker_model = _load_model(backend)
+
+
+def _worker_ready():
+    # 모든 워커가 모델을 올리고 이 지점에 도착할 때까지 대기
+    # (대기 중인 워커는 다음 작업을 가져가지 않으므로 워커 수만큼의 작업이 서로 다른 프로세스에 하나씩 배정됨)
+    _ready_barrier.wait()
+    return os.getpid()
+
+
+def _release_handles(handles):
+    # 모델이 직전 프레임을 아직 참조하고 있으면 다음 호출 때 다시 해제 시도
+    still_open = []
+    for shm in _stale_handles + handles:
+        try:
+            shm.close()
+        except BufferError:
+            still_open.append(shm)
+    _stale_handles[:] = still_open
+
+
+def _predict_shared(frames):
+    """frames: [(공유 메모리 이름, shape, dtype)] — 이미지 배열은 복사/피클링 없이 공유 메모리에서 바로 읽는다."""
+    handles = []
+    images = []
+    try:
+        for name, shape, dtype in frames:
+            shm = shared_memory.SharedMemory(name=name)
+            handles.append(shm)
+            images.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        return _run_model(_worker_model, images)
+    finally:
+        del images
+        _release_handles(handles)
+
+
+# ---- API 프로세스 측 ----
+class LocalDetector:
+    """API 프로세스 안에서 전용 스레드 하나로 추론"""
+
+    concurrency = 1
+
+    def __init__(self, backend: str = DETECTOR_BACKEND):
+        self.backend = backend
+        self.model = None
+        # 모델은 스레드 안전하지 않으므로 추론 스레드는 하나만 사용
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-infer")
+
+    def warm_up(self):
+        if self.model is None:
+            self.model = _load_model(self.backend)
+
+    def _predict(self, images):
+        self.warm_up()
+        return _run_model(self.model, images)
+
+    async def predict(self, images):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._predict, images)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class ProcessDetectorPool:
+    """모델을 하나씩 올린 검출 워커 프로세스 풀. 프레임은 공유 메모리로 전달한다."""
+
+    def __init__(self, workers: int, backend: str = DETECTOR_BACKEND):
+        self.concurrency = workers
+        self.backend = backend
+        # warm_up(기본 스레드풀)과 predict(이벤트 루프)가 동시에 풀을 교체하지 않도록
+        self._replace_lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        # torch는 fork 이후 스레드 상태가 불안정하므로 spawn 사용
+        context = multiprocessing.get_context("spawn")
+        # 동기화 객체는 작업으로 넘길 수 없으므로 워커 생성 시 전달 (풀을 교체할 때마다 새로 만듦)
+        ready_barrier = context.Barrier(self.concurrency)
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.backend, ready_barrier),
+        )
+
+    def _replace_broken(self, executor):
+        """
+        워커가 죽어(OOM, 네이티브 크래시) 영구히 BrokenProcessPool 이 된 풀을 새 풀로 교체
+        새 워커의 모델 로딩은 다음 warm_up 에서 (같은 풀로 실패한 여러 배치가 있어도 한 번만 교체)
+        """
+        with self._replace_lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+
+    def warm_up(self):
+        # 워커 수만큼 작업을 넣고, 모든 프로세스가 모델 로딩/워밍업을 끝내고 배리어에 모일 때까지 대기
+        executor = self._executor
+        try:
+            futures = [executor.submit(_worker_ready) for _ in range(self.concurrency)]
+            for future in futures:
+                future.result()
+        except BrokenProcessPool:
+            # 로딩 중 워커가 죽었으면 다음 재시도는 새 풀로
+            self._replace_broken(executor)
+            raise
+
+    async def predict(self, images):
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        handles = []
+        try:
+            frames = []
+            for img in images:
+                shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+                handles.append(shm)
+                np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+                frames.append((shm.name, img.shape, img.dtype.str))
+            return await loop.run_in_executor(executor, _predict_shared, frames)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise
+        finally:
+            for shm in handles:
+                shm.close()
+                shm.unlink()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_detector():
+    if DETECTOR_WORKERS > 0:
+        return ProcessDetectorPool(DETECTOR_WORKERS)
+    return LocalDetector()
+
+
+class BatchInferenceEngine:
+    """
+    여러 요청에서 들어온 프레임을 마이크로 배치로 모아
+    이벤트 루프 밖(추론 스레드 또는 워커 프로세스)에서 YOLO 추론을 실행하는 엔진
+    """
+
+    def __init__(self, detector, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+        self._inflight = set()
+        # 워커 프로세스 풀이 망가졌을 때 호출 (준비 상태를 실패로 바꿔 다음 요청에서 새 풀을 워밍업)
+        self.on_detector_lost = None
+
+    async def start(self):
+        """시작 시점에 모델 로딩과 워밍업을 끝낸다."""
+        await asyncio.get_running_loop().run_in_executor(None, self.detector.warm_up)
+
+    async def detect(self, img: np.ndarray):
+        """프레임 한 장을 큐에 넣고 (boxes, clss, confs) 결과를 기다린다."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect_loop())
+
+        future = loop.create_future()
+        await self._queue.put((img, future))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 클라이언트 연결이 끊겨 취소된 요청은 제외
+        return [(img, future) for img, future in batch if not future.done()]
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        # 검출기가 동시에 처리할 수 있는 배치 수만큼만 내보내고, 나머지는 큐에서 다음 배치로 모은다
+        slots = asyncio.Semaphore(self.detector.concurrency)
+        while True:
+            await slots.acquire()
+            batch = await self._next_batch()
+            if not batch:
+                slots.release()
+                continue
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _dispatch(self, batch):
+        try:
+            results = await self.detector.predict([img for img, _ in batch])
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self.on_detector_lost is not None:
+                self.on_detector_lost(e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._inflight):
+            task.cancel()
+        self.detector.close()
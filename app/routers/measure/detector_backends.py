@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import cv2
+import numpy as np
+
+# 검출 백엔드 (ultralytics, onnx, openvino)
+DETECTOR_BACKEND = os.getenv("MEASURE_DETECTOR_BACKEND", "ultralytics")
+
+# 백엔드별 모델 경로
+MODEL_PATH = os.getenv("MEASURE_MODEL_PATH", "yolov8s.pt")
+ONNX_MODEL_PATH = os.getenv("MEASURE_ONNX_MODEL_PATH", "yolov8s.onnx")
+# INT8 IR 은 `yolo export format=openvino int8=True` 로 만든 모델 경로를 지정
+OPENVINO_MODEL_PATH = os.getenv("MEASURE_OPENVINO_MODEL_PATH", "yolov8s_openvino_model/yolov8s.xml")
+
+# 추론 스레드 수 (0이면 런타임 기본값)
+INFER_THREADS = int(os.getenv("MEASURE_INFER_THREADS", "0"))
+# ONNX 모델을 INT8 로 동적 양자화해서 사용할지 여부
+ONNX_INT8 = os.getenv("MEASURE_ONNX_INT8", "0") == "1"
+
+# ultralytics 기본값과 동일한 전처리/후처리 설정
+INPUT_SIZE = 640
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class UltralyticsModel:
+    """PyTorch 기반 ultralytics YOLO"""
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path, task="detect")
+
+    def predict(self, images, conf: float):
+        results = self.model(images, conf=conf, verbose=False)
+        return [
+            (
+                res.boxes.xyxy.cpu().numpy(),
+                res.boxes.cls.cpu().numpy().astype(int),
+                res.boxes.conf.cpu().numpy(),
+            )
+            for res in results
+        ]
+
+
+def letterbox(img: np.ndarray):
+    """비율을 유지한 채 INPUT_SIZE 정사각형으로 리사이즈 + 패딩 (NCHW float32 RGB 반환)"""
+    height, width = img.shape[:2]
+    ratio = min(INPUT_SIZE / height, INPUT_SIZE / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_w, pad_h = (INPUT_SIZE - new_w) / 2, (INPUT_SIZE - new_h) / 2
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    tensor = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor, (ratio, left, top)
+
+
+def postprocess(output: np.ndarray, meta, shape, conf: float):
+    """YOLOv8 출력 (4 + 클래스 수, 앵커 수) -> 원본 좌표 (boxes.xyxy, cls, conf)"""
+    ratio, left, top = meta
+    scores_all = output[4:]
+    clss = scores_all.argmax(axis=0)
+    scores = scores_all[clss, np.arange(scores_all.shape[1])]
+    keep = scores > conf
+    if not keep.any():
+        return np.zeros((0, 4), np.float32), np.zeros((0,), int), np.zeros((0,), np.float32)
+
+    cx, cy, w, h = output[:4, keep]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    clss, scores = clss[keep], scores[keep]
+
+    # 클래스별 NMS (클래스마다 좌표를 띄워서 한 번에 처리)
+    offset = clss[:, None] * (INPUT_SIZE * 2)
+    nms_boxes = boxes + offset
+    xywh = np.concatenate([nms_boxes[:, :2], nms_boxes[:, 2:] - nms_boxes[:, :2]], axis=1)
+    idxs = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf, IOU_THRESHOLD)
+    idxs = np.array(idxs, dtype=int).reshape(-1)[:MAX_DETECTIONS]
+    boxes, clss, scores = boxes[idxs], clss[idxs], scores[idxs]
+
+    # 레터박스 좌표 -> 원본 좌표
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - left) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - top) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return boxes.astype(np.float32), clss.astype(int), scores.astype(np.float32)
+
+
+class ExportedYoloModel:
+    """ONNX / OpenVINO 로 내보낸 YOLOv8 공통 처리 (배치 축이 고정이면 한 장씩 실행)"""
+
+    batchable = False
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, images, conf: float):
+        prepared = [letterbox(img) for img in images]
+        if self.batchable:
+            outputs = self._infer(np.stack([tensor for tensor, _ in prepared]))
+        else:
+            outputs = np.concatenate([self._infer(tensor[None]) for tensor, _ in prepared])
+        return [
+            postprocess(output, meta, img.shape, conf)
+            for output, (_, meta), img in zip(outputs, prepared, images)
+        ]
+
+
+def quantize_int8(model_path: str) -> str:
+    """ONNX 모델을 INT8 동적 양자화 (한 번 만든 파일은 재사용)"""
+    int8_path = os.path.splitext(model_path)[0] + ".int8.onnx"
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        # 여러 작업 프로세스가 동시에 만들 수 있으므로 프로세스별 임시 디렉터리에서 만든 뒤 교체
+        # (다른 프로세스가 쓰다 만 파일을 읽지 않도록, 양자화가 원본 옆에 만드는 중간 파일도 겹치지 않도록 원본도 복사)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(int8_path))) as tmp_dir:
+            source = shutil.copy(model_path, tmp_dir)
+            tmp_path = os.path.join(tmp_dir, os.path.basename(int8_path))
+            quantize_dynamic(source, tmp_path, weight_type=QuantType.QUInt8)
+            os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxYoloModel(ExportedYoloModel):
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, threads: int = INFER_THREADS, int8: bool = ONNX_INT8):
+        import onnxruntime as ort
+        if int8:
+            model_path = quantize_int8(model_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # dynamic=True 로 내보낸 모델은 배치 축이 문자열(심볼)로 표시됨
+        self.batchable = not isinstance(model_input.shape[0], int)
+
+    def _infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoYoloModel(ExportedYoloModel):
+    def __init__(self, model_path: str = OPENVINO_MODEL_PATH, threads: int = INFER_THREADS):
+        import openvino as ov
+        core = ov.Core()
+        model = core.read_model(model_path)
+        self.batchable = model.input(0).get_partial_shape()[0].is_dynamic
+        config = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+        self.compiled = core.compile_model(model, "CPU", config)
+
+    def _infer(self, batch):
+        return self.compiled(batch)[0]
+
+
+DETECTOR_BACKENDS = {
+    "ultralytics": UltralyticsModel,
+    "onnx": OnnxYoloModel,
+    "openvino": OpenVinoYoloModel,
+}
+
+
+def load_backend(backend: str = DETECTOR_BACKEND):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"지원하지 않는 검출 백엔드입니다: {backend}")
+    return DETECTOR_BACKENDS[backend]()
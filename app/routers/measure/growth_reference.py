@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import os
+import numpy as np
+
+# 엑셀 시트/열 구성
+AGE_COLUMN = "만나이(개월)"
+GENDER_COLUMN = "성별"
+METRIC_SHEETS = ("연령별 신장", "연령별 체중", "연령별 체질량지수")
+HEIGHT, WEIGHT, BMI = range(len(METRIC_SHEETS))
+
+# 백분위수와 해당 값이 들어있는 열 (Unnamed: 7 ~ Unnamed: 18)
+PERCENTILE_POINTS = np.array([3, 5, 10, 15, 25, 50, 75, 85, 90, 95, 97, 99], dtype=np.float64)
+PERCENTILE_COLUMNS = [f"Unnamed: {i}" for i in range(7, 19)]
+MEDIAN_INDEX = 5  # 50th
+
+# 성별 코드 (1: 남자, 2: 여자) -> 배열 인덱스
+GENDERS = (1, 2)
+
+# 바이너리 캐시 형식 버전 (배열 구성이 바뀌면 올려서 기존 캐시를 무효화)
+CACHE_VERSION = 1
+CACHE_PREFIX = "growth_reference"
+
+
+def workbook_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"{CACHE_PREFIX}.v{CACHE_VERSION}.{digest[:16]}.npy")
+
+
+class GrowthReference:
+    """
+    (성별, 개월 수, 지표) 로 바로 인덱싱하는 성장 기준표
+    values[gender_index, age, metric] 에 백분위 곡선 12개 값이 연속으로 저장되며, 데이터가 없는 칸은 NaN
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+    @classmethod
+    def from_excel(cls, path: str) -> "GrowthReference":
+        import pandas as pd
+        frames = [
+            pd.read_excel(path, sheet_name=sheet).dropna(subset=[AGE_COLUMN, GENDER_COLUMN])
+            for sheet in METRIC_SHEETS
+        ]
+        max_age = int(max(df[AGE_COLUMN].max() for df in frames))
+        values = np.full((len(GENDERS), max_age + 1, len(METRIC_SHEETS), len(PERCENTILE_POINTS)), np.nan)
+
+        for metric, df in enumerate(frames):
+            grouped = df.groupby([AGE_COLUMN, GENDER_COLUMN])[PERCENTILE_COLUMNS].mean()
+            ages = grouped.index.get_level_values(0).to_numpy().astype(int)
+            genders = grouped.index.get_level_values(1).to_numpy().astype(int)
+            known = np.isin(genders, GENDERS) & (ages >= 0)
+            gender_idx = np.searchsorted(GENDERS, genders[known])
+            values[gender_idx, ages[known], metric] = grouped.to_numpy(dtype=np.float64)[known]
+
+        return cls(np.ascontiguousarray(values))
+
+    @classmethod
+    def load(cls, excel_path: str, cache_dir: str = None) -> "GrowthReference":
+        """
+        엑셀 해시로 키가 붙은 .npy 캐시를 메모리 매핑해서 로딩
+        캐시가 없거나(엑셀이 바뀐 경우 포함) 읽을 수 없을 때만 엑셀을 파싱해서 캐시를 새로 만든다
+        """
+        cache_dir = cache_dir or os.path.dirname(excel_path)
+        path = cache_path(cache_dir, workbook_hash(excel_path))
+        if os.path.exists(path):
+            try:
+                return cls(np.load(path, mmap_mode="r"))
+            except (OSError, ValueError) as e:
+                print(f"Growth reference cache unreadable, rebuilding: {e}")
+
+        reference = cls.from_excel(excel_path)
+        try:
+            reference.save(path)
+        except OSError as e:
+            print(f"Growth reference cache not written: {e}")
+        return reference
+
+    def save(self, path: str):
+        # 여러 워커가 동시에 만들어도 깨진 파일이 보이지 않도록 임시 파일에 쓴 뒤 교체
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.values)
+        os.replace(tmp_path, path)
+        # 이전 엑셀/형식 버전의 캐시 정리
+        for stale in glob.glob(os.path.join(os.path.dirname(path), f"{CACHE_PREFIX}.v*.npy")):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    @property
+    def max_age(self) -> int:
+        return self.values.shape[1] - 1
+
+    def curves(self, gender: int, age: int):
+        """(지표 3개, 백분위 12개) 배열, 데이터가 없으면 None"""
+        if gender not in GENDERS or not 0 <= age <= self.max_age:
+            return None
+        curves = self.values[GENDERS.index(gender), age]
+        if np.isnan(curves).any():
+            return None
+        return curves
+
+
+def percentile_from_value(curve: np.ndarray, value: float) -> float:
+    """백분위 곡선 위에서 값의 백분위를 선형 보간 (범위 밖은 3th / 99th 로 고정)"""
+    return float(np.interp(value, curve, PERCENTILE_POINTS))
+
+
+def lookup_curves(reference: GrowthReference, genders: np.ndarray, ages: np.ndarray):
+    """여러 관측치의 백분위 곡선을 한 번에 조회 -> ((N, 지표 3개, 백분위 12개), 유효 여부 마스크)"""
+    valid = np.isin(genders, GENDERS) & (ages >= 0) & (ages <= reference.max_age)
+    gender_idx = np.where(valid, np.searchsorted(GENDERS, genders), 0)
+    age_idx = np.where(valid, ages, 0)
+    curves = reference.values[gender_idx, age_idx]
+    valid &= ~np.isnan(curves).any(axis=(1, 2))
+    return curves, valid
+
+
+def batch_percentiles(curves: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """행마다 다른 백분위 곡선 (N, 12) 위에서 값 (N,) 의 백분위를 한 번에 선형 보간"""
+    rows = np.arange(len(values))
+    # 값 이하인 곡선 점 개수로 구간을 찾고, 범위 밖은 첫/마지막 구간에서 고정
+    idx = np.clip((curves <= values[:, None]).sum(axis=1), 1, curves.shape[1] - 1)
+    x0, x1 = curves[rows, idx - 1], curves[rows, idx]
+    y0, y1 = PERCENTILE_POINTS[idx - 1], PERCENTILE_POINTS[idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(x1 > x0, (values - x0) / (x1 - x0), 0.0)
+    return y0 + np.clip(t, 0.0, 1.0) * (y1 - y0)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, File, UploadFile
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from passlib.context import CryptContext
 from fastapi.responses import RedirectResponse
 from email.mime.text import MIMEText
@@ -8,13 +9,13 @@ from app.utils import create_access_token, get_current_user
 from app.schemas import NicknameRequest, EmailVerificationRequest, EmailVerificationConfirmRequest, LoginRequest, UpdateUserInfoRequest
 from app.schemas import RegisterAllRequest, EmailCheckRequest, FindPwRequest, FindIdRequest, PhoneCheckRequest
 from app.models import User, Family, KidInfo
+from app.upload_storage import save_upload, acquire_media, release_media, discard_uploads, delete_files
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import timedelta
 import random
 import string
 import smtplib
 import logging
-import shutil
 
 # Token expiration time in minutes
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -233,21 +234,28 @@ def update_user_info(request: UpdateUserInfoRequest, db: Session = Depends(get_d
     return {"success": True, "message": f"{request.field.capitalize()} updated successfully"}
 
 @router.post("/update-profile-image")
-def update_profile_image(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db), file: UploadFile = File(...)):
+async def update_profile_image(background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_async_db), file: UploadFile = File(...)):
+    # 업로드를 기다리는 async 핸들러이므로 DB 도 비동기 세션으로 처리 (이벤트 루프를 막지 않도록)
     user_no = current_user.get("user_no")
-    user = db.query(User).filter(User.user_no == user_no).first()
+    user = await db.get(User, user_no)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # 파일 저장 경로 설정
-    file_location = f"static/uploaded_user_profile/{user_no}_{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 내용 해시 저장소에 저장 (같은 사진이면 파일을 새로 만들지 않음)
+    file_location = (await save_upload(file)).lstrip("/")
 
-    # DB에 프로필 이미지 경로 업데이트
-    user.user_profile = file_location
-    db.commit()
+    # DB에 프로필 이미지 경로 업데이트, 이전 이미지는 참조만 해제
+    try:
+        legacy_paths = await db.run_sync(release_media, [(user.user_profile,)]) if user.user_profile else []
+        await db.run_sync(acquire_media, [file_location])
+        user.user_profile = file_location
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        await discard_uploads([file_location])
+        raise HTTPException(status_code=500, detail="Profile image update failed")
+    background_tasks.add_task(delete_files, legacy_paths)
 
     return {"success": True, "message": "Profile image updated successfully", "profileImage": file_location}
 
@@ -27,7 +27,10 @@ class CommunityOut(BaseModel):
     user_no: int
     community_regist_at: datetime
     like_count: int
+    comment_count: int = 0
     user_nickname: str
+    # 피드 조회 시 user_no 를 넘긴 경우에만 채워짐
+    liked_by_me: Optional[bool] = None
     images: Optional[List[CommunityImageOut]] = []  # ← 이 부분 추가
 
     class Config:
@@ -247,4 +250,14 @@ class CompareRequest(BaseModel):
                 return int(value)
             except ValueError:
                 raise ValueError("gender 필드는 정수여야 합니다.")
-        return value
\ No newline at end of file
+        return value
+
+class CompareObservation(BaseModel):
+    ageInMonths: int
+    height: float
+    weight: float
+    gender: int
+
+class CompareBatchRequest(BaseModel):
+    observations: Optional[List[CompareObservation]] = None
+    kid_info_no: Optional[int] = None  # 지정하면 해당 아이의 측정 기록 전체를 비교
@@ -0,0 +1,246 @@
+import asyncio
+import glob
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import case, func, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app import models
+from app.database import SessionLocal
+
+# 업로드를 이 크기 단위로 나눠서 디스크에 기록 (파일 크기와 무관하게 메모리 사용량 고정)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1 << 20)))
+# 파일 하나 / 요청 하나의 최대 업로드 크기 (초과 시 413)
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(20 << 20)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(100 << 20)))
+
+# 내용 해시로 주소가 정해지는 이미지 저장소 (같은 사진은 한 번만 저장)
+MEDIA_DIR = "static/media"
+MEDIA_TMP_DIR = os.path.join(MEDIA_DIR, "tmp")
+# 참조가 없어진 파일을 지우기 전 유예 시간과 정리 주기
+MEDIA_GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", "600"))
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv("MEDIA_GC_INTERVAL_SECONDS", "300"))
+MEDIA_GC_BATCH = 500
+
+
+class _RequestBudget:
+    """한 요청에서 여러 파일이 함께 쓰는 업로드 용량 (이벤트 루프 안에서만 갱신하므로 잠금 불필요)"""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+
+    def consume(self, size: int):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail="요청의 전체 업로드 크기가 너무 큽니다.")
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _store_blob(tmp_path: str, blob_path: str):
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    if os.path.exists(blob_path):
+        # 이미 있는 내용이면 임시 파일만 버리고, 정리 대상이 되지 않도록 수정 시각 갱신
+        os.utime(blob_path)
+        _remove(tmp_path)
+    else:
+        os.replace(tmp_path, blob_path)
+
+
+def is_media_path(path: str) -> bool:
+    return bool(path) and path.lstrip("/").startswith(MEDIA_DIR + "/")
+
+
+def _blob_key(path: str) -> str:
+    # 프로필 이미지는 앞의 "/" 없이 저장되므로 키는 항상 "/" 로 시작하도록 맞춤
+    return "/" + path.lstrip("/")
+
+
+async def save_upload(file: UploadFile, budget: _RequestBudget = None) -> str:
+    """
+    업로드 파일을 청크 단위로 저장하면서 SHA-256 을 계산하고, 내용 해시 경로 "/static/media/ab/cd/{해시}{확장자}" 를 반환
+    저장된 파일은 acquire_media 로 참조를 기록해야 정리 대상에서 빠진다
+    """
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    await run_in_threadpool(os.makedirs, MEDIA_TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(MEDIA_TMP_DIR, uuid4().hex)
+    digest = hashlib.sha256()
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    written = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            written += len(chunk)
+            if written > UPLOAD_MAX_FILE_BYTES:
+                raise HTTPException(status_code=413, detail=f"{file.filename} 파일이 너무 큽니다.")
+            if budget is not None:
+                budget.consume(len(chunk))
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(_remove, tmp_path)
+        raise
+    await run_in_threadpool(f.close)
+
+    hexdigest = digest.hexdigest()
+    blob_path = os.path.join(MEDIA_DIR, hexdigest[:2], hexdigest[2:4], f"{hexdigest}{ext}")
+    await run_in_threadpool(_store_blob, tmp_path, blob_path)
+    return f"/{blob_path}"
+
+
+async def save_uploads(files) -> list:
+    """여러 파일을 동시에 저장, 하나라도 실패하면 이미 저장한 파일은 정리 대상으로 넘기고 예외를 다시 발생"""
+    if not files:
+        return []
+    budget = _RequestBudget(UPLOAD_MAX_REQUEST_BYTES)
+    results = await asyncio.gather(
+        *(save_upload(file, budget) for file in files),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await discard_uploads([result for result in results if isinstance(result, str)])
+        raise errors[0]
+    return results
+
+
+def acquire_media(db: Session, paths):
+    """호출한 쪽 트랜잭션 안에서 저장소 파일들의 참조 수 증가 (같은 파일이 여러 번이면 그만큼)"""
+    counts = Counter(_blob_key(path) for path in paths if is_media_path(path))
+    if not counts:
+        return
+    stmt = insert(models.MediaBlob).values([
+        {"blob_path": path, "ref_count": count} for path, count in counts.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.MediaBlob.blob_path],
+        set_={
+            "ref_count": models.MediaBlob.ref_count + stmt.excluded.ref_count,
+            "blob_released_at": None,
+        }
+    ))
+
+
+def release_media(db: Session, path_groups) -> list:
+    """
+    호출한 쪽 트랜잭션 안에서 [원본, 변환본...] 묶음들의 참조 수 감소
+    저장소 밖의 예전 파일(uuid 이름) 경로는 반환하므로, 커밋 후 delete_files 로 지우면 된다
+    """
+    counts = Counter()
+    legacy = []
+    for group in path_groups:
+        original = group[0]
+        if is_media_path(original):
+            counts[_blob_key(original)] += 1
+        else:
+            legacy.extend(path for path in group if path)
+    for path, count in counts.items():
+        remaining = func.greatest(models.MediaBlob.ref_count - count, 0)
+        db.execute(
+            update(models.MediaBlob)
+            .where(models.MediaBlob.blob_path == path)
+            .values(
+                ref_count=remaining,
+                blob_released_at=case((remaining == 0, func.now()), else_=None)
+            )
+        )
+    return legacy
+
+
+def _mark_orphans(paths):
+    db = SessionLocal()
+    try:
+        db.execute(
+            insert(models.MediaBlob)
+            .values([{"blob_path": path, "ref_count": 0, "blob_released_at": func.now()} for path in paths])
+            .on_conflict_do_nothing(index_elements=[models.MediaBlob.blob_path])
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def discard_uploads(paths):
+    """저장은 했지만 참조를 기록하지 못한 파일 처리 (다른 글이 같은 파일을 쓰고 있을 수 있으므로 바로 지우지 않음)"""
+    paths = {_blob_key(path) for path in paths if is_media_path(path)}
+    if paths:
+        await run_in_threadpool(_mark_orphans, list(paths))
+
+
+def delete_file(path: str):
+    """"/static/..." 형태의 이미지 경로에 해당하는 파일 삭제 (없으면 무시)"""
+    if path:
+        _remove(path.lstrip("/"))
+
+
+async def delete_files(paths):
+    paths = [path for path in paths if path]
+    if paths:
+        await run_in_threadpool(lambda: [delete_file(path) for path in paths])
+
+
+def collect_orphan_media() -> int:
+    """참조 수가 0 인 채로 유예 시간이 지난 파일과 변환본 삭제 -> 삭제한 개수"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=MEDIA_GC_GRACE_SECONDS)
+    db = SessionLocal()
+    try:
+        paths = db.execute(
+            text("""
+                DELETE FROM tb_media_blob
+                WHERE blob_path IN (
+                    SELECT blob_path FROM tb_media_blob
+                    WHERE ref_count = 0 AND blob_released_at < :cutoff
+                    LIMIT :batch
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING blob_path
+            """),
+            {"cutoff": cutoff, "batch": MEDIA_GC_BATCH}
+        ).scalars().all()
+        db.commit()
+    finally:
+        db.close()
+
+    for path in paths:
+        source = path.lstrip("/")
+        try:
+            # 유예 시간 안에 같은 내용이 다시 업로드되었으면 파일은 남겨 둠 (참조는 새로 기록됨)
+            if datetime.now(timezone.utc).timestamp() - os.path.getmtime(source) < MEDIA_GC_GRACE_SECONDS:
+                continue
+        except OSError:
+            pass
+        _remove(source)
+        # 이 파일의 변환본("{해시}{확장자}.{이름}.webp")만 삭제
+        for variant in glob.glob(f"{glob.escape(source)}.*.webp"):
+            _remove(variant)
+        # 예전 이름 규칙("{해시}.{이름}.webp")의 변환본은 같은 내용의 다른 확장자 파일이 남아 있지 않을 때만 삭제
+        stem = os.path.splitext(source)[0]
+        siblings = [p for p in glob.glob(f"{glob.escape(stem)}.*") if "." not in p[len(stem) + 1:]]
+        if not siblings:
+            for variant in glob.glob(f"{glob.escape(stem)}.*.webp"):
+                _remove(variant)
+    return len(paths)
+
+
+async def run_media_gc():
+    """lifespan 에서 실행하는 주기적 정리 작업"""
+    while True:
+        await asyncio.sleep(MEDIA_GC_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(collect_orphan_media)
+        except Exception as e:
+            print(f"Media GC failed: {e}")
@@ -0,0 +1,9 @@
+-- 피드(작성일 순)와 인기글(좋아요 순) 키셋 페이지네이션용 복합 인덱스
+-- models.Community 의 ix_tb_community_regist_at_no / ix_tb_community_like_count_no 와 동일
+-- 쓰기를 막지 않도록 CONCURRENTLY 로 생성 (트랜잭션 밖에서 실행)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tb_community_regist_at_no
+    ON tb_community (community_regist_at DESC, community_no DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tb_community_like_count_no
+    ON tb_community (like_count DESC, community_no DESC);
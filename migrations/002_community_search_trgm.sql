@@ -0,0 +1,19 @@
+-- 커뮤니티 검색(/communities/search)용 pg_trgm 확장, 정규화 제목 컬럼, trigram GIN 인덱스
+-- 인덱스 식은 community.SEARCH_FIELDS 의 검색 식과 같아야 인덱스를 탄다
+
+-- 확장 생성에는 DB 소유자 또는 슈퍼유저 권한 필요
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 공백을 제거한 제목 (DB 가 생성 컬럼으로 유지, 추가 시 테이블을 한 번 다시 씀)
+ALTER TABLE tb_community
+    ADD COLUMN IF NOT EXISTS community_search_title text
+    GENERATED ALWAYS AS (replace(community_title, ' ', '')) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tb_community_search_title_trgm
+    ON tb_community USING gin (community_search_title gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tb_community_content_trgm
+    ON tb_community USING gin (replace(community_content, ' ', '') gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tb_users_nickname_trgm
+    ON tb_users USING gin (replace(user_nickname, ' ', '') gin_trgm_ops);
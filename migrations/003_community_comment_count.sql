@@ -0,0 +1,23 @@
+-- 글마다 저장하는 댓글 수 (댓글 작성/삭제 트랜잭션에서 함께 갱신)
+-- 피드/인기글/검색/상세/댓글 수 조회가 모두 이 컬럼을 읽으므로 배포 전에 적용
+
+BEGIN;
+
+-- 컬럼 추가 중 새 댓글이 들어와 집계와 어긋나지 않도록 댓글 쓰기를 잠시 막음
+LOCK TABLE tb_community_coment IN SHARE MODE;
+
+ALTER TABLE tb_community
+    ADD COLUMN IF NOT EXISTS comment_count integer NOT NULL DEFAULT 0;
+
+-- 기존 글의 댓글 수 채우기 (다시 실행해도 같은 값)
+UPDATE tb_community c
+SET comment_count = m.cnt
+FROM (
+    SELECT community_no, count(*) AS cnt
+    FROM tb_community_coment
+    GROUP BY community_no
+) m
+WHERE m.community_no = c.community_no
+  AND c.comment_count <> m.cnt;
+
+COMMIT;
@@ -0,0 +1,39 @@
+-- 글마다 사용자당 좋아요 하나 (좋아요 토글의 ON CONFLICT (community_no, user_no) 대상)
+-- 이 제약 조건이 없으면 좋아요 토글이 "no unique or exclusion constraint matching" 오류로 실패
+
+BEGIN;
+
+-- 정리하는 동안 새 중복이 생기지 않도록 좋아요 쓰기를 막음 (조회는 가능)
+LOCK TABLE tb_communitylike IN SHARE ROW EXCLUSIVE MODE;
+
+-- 중복 좋아요는 가장 먼저 누른 것만 남김
+DELETE FROM tb_communitylike a
+USING tb_communitylike b
+WHERE a.community_no = b.community_no
+  AND a.user_no = b.user_no
+  AND a.like_id > b.like_id;
+
+-- 중복이 섞여 있던 좋아요 수를 실제 행 수로 다시 맞춤
+UPDATE tb_community c
+SET like_count = coalesce(l.cnt, 0)
+FROM tb_community c2
+LEFT JOIN (
+    SELECT community_no, count(*) AS cnt
+    FROM tb_communitylike
+    GROUP BY community_no
+) l ON l.community_no = c2.community_no
+WHERE c.community_no = c2.community_no
+  AND c.like_count IS DISTINCT FROM coalesce(l.cnt, 0);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_tb_communitylike_community_user'
+    ) THEN
+        ALTER TABLE tb_communitylike
+            ADD CONSTRAINT uq_tb_communitylike_community_user UNIQUE (community_no, user_no);
+    END IF;
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- 백그라운드에서 만드는 WebP 변환본(썸네일/피드) 경로, 만들기 전에는 NULL
+-- 글/댓글 이미지 조회가 모두 이 컬럼을 읽으므로 배포 전에 적용 (NULL 컬럼 추가라 테이블을 다시 쓰지 않음)
+
+ALTER TABLE tb_community_image
+    ADD COLUMN IF NOT EXISTS image_thumb_path text,
+    ADD COLUMN IF NOT EXISTS image_feed_path text;
+
+ALTER TABLE tb_community_coment_image
+    ADD COLUMN IF NOT EXISTS coment_image_thumb_path text,
+    ADD COLUMN IF NOT EXISTS coment_image_feed_path text;
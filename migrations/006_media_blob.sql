@@ -0,0 +1,16 @@
+-- 내용 해시로 저장한 이미지 파일과 참조 수 (글/댓글 이미지, 프로필 이미지가 공유)
+-- 모든 업로드가 같은 트랜잭션에서 이 테이블에 참조를 기록하므로 배포 전에 적용
+
+CREATE TABLE IF NOT EXISTS tb_media_blob (
+    blob_path text NOT NULL,
+    ref_count integer NOT NULL DEFAULT 0,
+    blob_regist_at timestamp with time zone NOT NULL DEFAULT now(),
+    -- 참조 수가 0 이 된 시각 (유예 시간이 지나면 백그라운드에서 파일 삭제)
+    blob_released_at timestamp with time zone,
+    PRIMARY KEY (blob_path)
+);
+
+-- 정리 작업이 찾는 참조 없는 파일만 담는 부분 인덱스
+CREATE INDEX IF NOT EXISTS ix_tb_media_blob_released_at
+    ON tb_media_blob (blob_released_at)
+    WHERE ref_count = 0;